@@ -1,54 +1,161 @@
 import random
-from typing import List, Tuple, Dict
+from array import array
+from functools import lru_cache
+from typing import List, Tuple, Dict, Optional
+from config import SHOE_DECKS, SHOE_PENETRATION
+
+# 카드는 0~51 정수 코드로 표현 (코드 = 무늬 * 13 + 랭크 인덱스)
+SUITS = ['스페이드', '하트', '다이아몬드', '클럽']
+RANKS = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+SUIT_SYMBOLS = {'스페이드': '♠', '하트': '♥', '다이아몬드': '♦', '클럽': '♣'}
+
+# 코드별 바카라 카드 값 / 표시 문자열 (미리 계산)
+CARD_VALUES = bytes((rank + 1) if rank < 9 else 0 for suit in range(4) for rank in range(13))
+CARD_VALUE_TRANSLATION = CARD_VALUES + bytes(256 - len(CARD_VALUES))  # bytes.translate용
+CARD_SYMBOLS = tuple(f"{SUIT_SYMBOLS[suit]}{rank}" for suit in SUITS for rank in RANKS)
+
+# 세 번째 카드 규칙표 (BaccaratGame.should_draw_* 규칙과 verify_draw_tables로 대조)
+PLAYER_STANDS = 10  # BANKER_DRAW_TABLE에서 플레이어가 세 번째 카드를 받지 않은 경우의 인덱스
+
+# 뱅커 두 장 합별로 세 번째 카드를 받는 플레이어 세 번째 카드 값
+# (0~2는 플레이어 스탠드 시에도 드로우, 7~9는 항상 스탠드)
+_BANKER_DRAW_VALUES = {
+    0: range(11), 1: range(11), 2: range(11),
+    3: (0, 1, 2, 3, 4, 5, 6, 7, 9),
+    4: range(2, 8),
+    5: range(4, 8),
+    6: (6, 7),
+}
+
+# [플레이어 합 * 10 + 뱅커 합] -> 내추럴(8 또는 9) 여부
+NATURAL_TABLE = bytes(player >= 8 or banker >= 8 for player in range(10) for banker in range(10))
+# [플레이어 두 장 합] -> 세 번째 카드 여부
+PLAYER_DRAW_TABLE = bytes(total <= 5 for total in range(10))
+# [뱅커 두 장 합 * 11 + 플레이어 세 번째 카드 값 (스탠드면 PLAYER_STANDS)] -> 세 번째 카드 여부
+BANKER_DRAW_TABLE = bytes(
+    value in _BANKER_DRAW_VALUES.get(banker, ()) for banker in range(10) for value in range(PLAYER_STANDS + 1)
+)
+# [플레이어 합 * 10 + 뱅커 합] -> 승자
+WINNER_TABLE = tuple(
+    "플레이어" if player > banker else "뱅커" if banker > player else "무승부"
+    for player in range(10) for banker in range(10)
+)
+# 베팅 타입 (승자 이름과 동일)
+BET_TYPES = ("플레이어", "뱅커", "무승부")
 
 class Card:
-    """카드 클래스"""
+    """카드 클래스 (표시용, 게임 진행은 정수 코드 사용)"""
     def __init__(self, suit: str, rank: str):
         self.suit = suit  # 스페이드, 하트, 다이아몬드, 클럽
         self.rank = rank  # A, 2-9, 10, J, Q, K
     
+    @classmethod
+    def from_code(cls, code: int) -> 'Card':
+        """정수 코드로부터 카드 생성"""
+        return cls(SUITS[code // 13], RANKS[code % 13])
+    
+    @property
+    def code(self) -> int:
+        return SUITS.index(self.suit) * 13 + RANKS.index(self.rank)
+    
     def get_value(self) -> int:
         """바카라에서의 카드 값 반환"""
-        if self.rank in ['J', 'Q', 'K']:
-            return 0
-        elif self.rank == 'A':
-            return 1
-        elif self.rank == '10':
-            return 0
-        else:
-            return int(self.rank)
+        return CARD_VALUES[self.code]
     
     def __str__(self):
-        suit_symbols = {'스페이드': '♠', '하트': '♥', '다이아몬드': '♦', '클럽': '♣'}
-        return f"{suit_symbols.get(self.suit, self.suit)}{self.rank}"
+        return f"{SUIT_SYMBOLS.get(self.suit, self.suit)}{self.rank}"
 
 class Deck:
-    """카드 덱 클래스"""
+    """카드 덱 클래스 (카드 코드 배열)"""
+    _TEMPLATE = array('B', range(52))
+    
     def __init__(self):
-        self.cards = []
+        self.cards = array('B')
         self.reset_deck()
     
     def reset_deck(self):
-        """덱 초기화 (52장)"""
-        suits = ['스페이드', '하트', '다이아몬드', '클럽']
-        ranks = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+        """덱 초기화 (52장)
         
-        self.cards = []
-        for suit in suits:
-            for rank in ranks:
-                self.cards.append(Card(suit, rank))
-        
-        self.shuffle()
+        미리 섞지 않고 deal_card에서 남은 카드 중 하나를 무작위로 뽑습니다
+        (지연 Fisher-Yates, 매번 섞은 덱에서 뽑는 것과 같은 분포).
+        """
+        self.cards[:] = self._TEMPLATE
     
     def shuffle(self):
         """카드 섞기"""
         random.shuffle(self.cards)
     
-    def deal_card(self) -> Card:
-        """카드 한 장 뽑기"""
-        if len(self.cards) < 10:  # 카드가 부족하면 새 덱으로 교체
+    def deal_card(self) -> int:
+        """카드 한 장 뽑기 (카드 코드 반환)"""
+        cards = self.cards
+        remaining = len(cards)
+        if remaining < 10:  # 카드가 부족하면 새 덱으로 교체
             self.reset_deck()
-        return self.cards.pop()
+            remaining = len(cards)
+        
+        # 무작위 위치의 카드를 꺼내고 그 자리를 마지막 카드로 채움
+        index = int(random.random() * remaining)
+        card = cards[index]
+        cards[index] = cards[remaining - 1]
+        cards.pop()
+        return card
+
+class Shoe:
+    """N덱 슈 (컷 카드 포함)
+    
+    컷 카드에 도달하면 진행 중인 라운드는 마저 진행하고, 다음 라운드 전에
+    start_new_shoe로 미리 섞어 둔 다음 슈(next_cards)로 교체합니다.
+    prepare_next_shoe는 정산 경로 밖(백그라운드 스레드)에서 호출하기 위한 것입니다.
+    """
+    __slots__ = ('decks', 'cards', 'position', 'cut_position', 'next_cards', 'preparing')
+    
+    def __init__(self, decks: int = SHOE_DECKS, penetration: float = SHOE_PENETRATION):
+        self.decks = decks
+        self.cards = None       # 현재 슈 (카드 코드 배열)
+        self.position = 0       # 다음에 나올 카드 위치
+        self.cut_position = int(52 * decks * penetration)
+        self.next_cards = None  # 미리 섞어 둔 다음 슈
+        self.preparing = False
+    
+    def shuffled_cards(self) -> array:
+        """새로 섞은 슈 생성"""
+        cards = Deck._TEMPLATE * self.decks
+        random.shuffle(cards)
+        return cards
+    
+    def prepare_next_shoe(self):
+        """다음 슈를 미리 섞어 둠"""
+        try:
+            if self.next_cards is None:
+                self.next_cards = self.shuffled_cards()
+        finally:
+            self.preparing = False
+    
+    @property
+    def needs_new_shoe(self) -> bool:
+        """컷 카드에 도달했는지 (또는 아직 슈가 없는지)"""
+        return self.cards is None or self.position >= self.cut_position
+    
+    def remaining_counts(self) -> Tuple[int, ...]:
+        """다음 라운드에 쓰일 슈의 값(0~9)별 남은 장수"""
+        if self.needs_new_shoe:
+            return (16 * self.decks,) + (4 * self.decks,) * 9
+        values = bytes(self.cards[self.position:]).translate(CARD_VALUE_TRANSLATION)
+        return tuple(values.count(value) for value in range(10))
+    
+    def start_new_shoe(self):
+        """다음 슈로 교체 (미리 섞은 슈가 없으면 여기서 섞음)"""
+        next_cards, self.next_cards = self.next_cards, None
+        self.cards = next_cards if next_cards is not None else self.shuffled_cards()
+        self.position = 0
+    
+    def deal_card(self) -> int:
+        """카드 한 장 뽑기 (카드 코드 반환)"""
+        if self.cards is None or self.position >= len(self.cards):
+            self.start_new_shoe()
+        card = self.cards[self.position]
+        self.position += 1
+        return card
 
 class BaccaratGame:
     """바카라 게임 클래스"""
@@ -57,87 +164,73 @@ class BaccaratGame:
         self.player_cards = []
         self.banker_cards = []
     
-    def calculate_hand_value(self, cards: List[Card]) -> int:
+    def calculate_hand_value(self, cards: List[int]) -> int:
         """핸드 값 계산 (바카라 규칙: 일의 자리만)"""
-        total = sum(card.get_value() for card in cards)
+        total = 0
+        for card in cards:
+            total += CARD_VALUES[card]
         return total % 10
     
     def should_draw_third_card_player(self, player_total: int) -> bool:
         """플레이어 세 번째 카드 뽑기 규칙"""
         return player_total <= 5
     
-    def should_draw_third_card_banker(self, banker_total: int, player_total: int, player_third_card: Card = None) -> bool:
-        """뱅커 세 번째 카드 뽑기 규칙"""
+    def should_draw_third_card_banker(self, banker_total: int, player_total: int, player_third_card: Optional[int] = None) -> bool:
+        """뱅커 세 번째 카드 뽑기 규칙 (player_third_card: 카드 코드)"""
         if banker_total <= 2:
             return True
-        elif banker_total == 3:
-            if player_third_card is None:
-                return False
-            return player_third_card.get_value() != 8
+        if player_third_card is None or banker_total >= 7:
+            return False
+        
+        third_value = CARD_VALUES[player_third_card]
+        if banker_total == 3:
+            return third_value != 8
         elif banker_total == 4:
-            if player_third_card is None:
-                return False
-            return player_third_card.get_value() in [2, 3, 4, 5, 6, 7]
+            return 2 <= third_value <= 7
         elif banker_total == 5:
-            if player_third_card is None:
-                return False
-            return player_third_card.get_value() in [4, 5, 6, 7]
-        elif banker_total == 6:
-            if player_third_card is None:
-                return False
-            return player_third_card.get_value() in [6, 7]
+            return 4 <= third_value <= 7
         else:
-            return False
+            return 6 <= third_value <= 7
     
-    def play_round(self) -> Dict:
-        """한 라운드 게임 진행"""
-        # 초기화
-        self.player_cards = []
-        self.banker_cards = []
+    def play_round(self, shoe: Optional[Shoe] = None) -> Dict:
+        """한 라운드 게임 진행 (shoe를 주면 해당 슈에서 딜)
+        
+        세 번째 카드 판단은 규칙표 조회로, 점수는 누적 합계로 계산합니다.
+        """
+        deal_card = (shoe or self.deck).deal_card
+        values = CARD_VALUES
         
         # 초기 2장씩 딜
-        self.player_cards.append(self.deck.deal_card())
-        self.banker_cards.append(self.deck.deal_card())
-        self.player_cards.append(self.deck.deal_card())
-        self.banker_cards.append(self.deck.deal_card())
+        player_first = deal_card()
+        banker_first = deal_card()
+        player_second = deal_card()
+        banker_second = deal_card()
+        player_cards = self.player_cards = [player_first, player_second]
+        banker_cards = self.banker_cards = [banker_first, banker_second]
         
-        # 초기 점수 계산
-        player_total = self.calculate_hand_value(self.player_cards)
-        banker_total = self.calculate_hand_value(self.banker_cards)
+        player_total = (values[player_first] + values[player_second]) % 10
+        banker_total = (values[banker_first] + values[banker_second]) % 10
         
-        # 내추럴 체크 (8 또는 9)
-        if player_total >= 8 or banker_total >= 8:
-            # 내추럴이면 게임 종료
-            pass
-        else:
-            # 세 번째 카드 규칙 적용
-            player_third_card = None
+        # 내추럴 (8 또는 9)이 아니면 세 번째 카드 규칙 적용
+        if not NATURAL_TABLE[player_total * 10 + banker_total]:
+            third_value = PLAYER_STANDS
+            if PLAYER_DRAW_TABLE[player_total]:
+                card = deal_card()
+                player_cards.append(card)
+                third_value = values[card]
+                player_total = (player_total + third_value) % 10
             
-            # 플레이어 세 번째 카드
-            if self.should_draw_third_card_player(player_total):
-                player_third_card = self.deck.deal_card()
-                self.player_cards.append(player_third_card)
-                player_total = self.calculate_hand_value(self.player_cards)
-            
-            # 뱅커 세 번째 카드
-            if self.should_draw_third_card_banker(banker_total, player_total, player_third_card):
-                self.banker_cards.append(self.deck.deal_card())
-                banker_total = self.calculate_hand_value(self.banker_cards)
-        
-        # 승부 판정
-        if player_total > banker_total:
-            winner = "플레이어"
-        elif banker_total > player_total:
-            winner = "뱅커"
-        else:
-            winner = "무승부"
+            if BANKER_DRAW_TABLE[banker_total * 11 + third_value]:
+                card = deal_card()
+                banker_cards.append(card)
+                banker_total = (banker_total + values[card]) % 10
         
         return {
-            'player_cards': self.player_cards,
-            'banker_cards': self.banker_cards,
+            'player_cards': player_cards,
+            'banker_cards': banker_cards,
             'player_total': player_total,
             'banker_total': banker_total,
-            'winner': winner
+            'winner': WINNER_TABLE[player_total * 10 + banker_total]
         }
     
     def calculate_payout(self, bet_amount: int, bet_type: str, winner: str) -> int:
@@ -151,9 +244,40 @@ class BaccaratGame:
                 return bet_amount * 8  # 8:1 배당
         return 0  # 패배시 0원
     
-    def format_cards(self, cards: List[Card]) -> str:
-        """카드 목록을 문자열로 포맷"""
-        return " ".join(str(card) for card in cards)
+    def format_cards(self, cards: List[int]) -> str:
+        """카드 코드 목록을 문자열로 포맷"""
+        return " ".join(CARD_SYMBOLS[card] for card in cards)
+
+@lru_cache(maxsize=1)
+def payout_multipliers(unit: int = 10000) -> Dict[str, float]:
+    """calculate_payout 기준 베팅 타입별 당첨 시 지급 배수 (원금 포함)"""
+    game = BaccaratGame()
+    return {bet_type: game.calculate_payout(unit, bet_type, bet_type) / unit for bet_type in BET_TYPES}
+
+def verify_draw_tables() -> int:
+    """규칙표를 should_draw_* / 승부 판정 규칙과 모든 경우에 대해 대조
+    
+    Returns:
+        확인한 경우의 수 (불일치 시 AssertionError)
+    """
+    game = BaccaratGame()
+    checked = 0
+    for player_total in range(10):
+        for banker_total in range(10):
+            natural = player_total >= 8 or banker_total >= 8
+            assert NATURAL_TABLE[player_total * 10 + banker_total] == natural
+            winner = "플레이어" if player_total > banker_total else "뱅커" if banker_total > player_total else "무승부"
+            assert WINNER_TABLE[player_total * 10 + banker_total] == winner
+            
+            assert PLAYER_DRAW_TABLE[player_total] == game.should_draw_third_card_player(player_total)
+            # 플레이어 세 번째 카드: 스탠드(None) 또는 52장 각각
+            for third_card in [None] + list(range(52)):
+                third_value = PLAYER_STANDS if third_card is None else CARD_VALUES[third_card]
+                expected = game.should_draw_third_card_banker(banker_total, player_total, third_card)
+                assert BANKER_DRAW_TABLE[banker_total * 11 + third_value] == expected, \
+                    (banker_total, player_total, third_card)
+                checked += 1
+    return checked
 
 # 게임 테스트 함수
 def test_baccarat_game():
@@ -161,6 +285,7 @@ def test_baccarat_game():
     game = BaccaratGame()
     
     print("=== 바카라 게임 테스트 ===")
+    print(f"규칙표 대조: {verify_draw_tables()}가지 경우 일치")
     for i in range(3):
         print(f"\n--- 라운드 {i+1} ---")
         result = game.play_round()
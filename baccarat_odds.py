@@ -0,0 +1,248 @@
+"""
+남은 슈 구성에 대한 정확한 바카라 확률/기대값 계산
+
+슈 구성은 카드 값(0~9)별 남은 장수 10개로 나타냅니다. 개별 카드 대신 값별 장수로
+열거하고, 초기 4장은 순서 없는 쌍(플레이어 55 × 뱅커 55)으로 묶으며, 뱅커 세 번째
+카드는 값별 장수 합계표로 한 번에 더합니다. 결과는 구성별로 LRU 캐시됩니다.
+
+카드가 한 장만 나가도 구성이 바뀌어 전체를 다시 계산해야 하므로(8덱 기준 약 18ms의
+순수 Python 연산), 봇에서는 exact_odds_async로 별도 프로세스에서 계산합니다. 같은
+구성에 대한 동시 요청은 계산 하나를 함께 기다리고, 끝난 결과는 구성별로 재사용합니다.
+
+규칙은 baccarat_game.BaccaratGame과 같습니다 (뱅커 3~6은 플레이어가 세 번째 카드를
+받았을 때만 추가 카드 판단).
+"""
+
+import signal
+import asyncio
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from functools import lru_cache
+from typing import Dict, Tuple
+from baccarat_game import BANKER_DRAW_TABLE, payout_multipliers
+from config import ODDS_CACHE_SIZE, ODDS_WORKERS
+
+PLAYER, BANKER, TIE = 0, 1, 2
+WINNERS = ("플레이어", "뱅커", "무승부")
+
+# 순서 없는 카드 값 쌍과 그 순서 수
+_PAIRS = tuple((a, b, 1 if a == b else 2) for a in range(10) for b in range(a, 10))
+
+def _winner(player_total, banker_total):
+    if player_total > banker_total:
+        return PLAYER
+    if banker_total > player_total:
+        return BANKER
+    return TIE
+
+# OUTCOME[player_total][banker_total]
+OUTCOME = tuple(tuple(_winner(p, b) for b in range(10)) for p in range(10))
+
+def shoe_composition(decks: int = 8) -> Tuple[int, ...]:
+    """새 슈의 값별 장수 (10/J/Q/K는 0)"""
+    return (16 * decks,) + (4 * decks,) * 9
+
+@lru_cache(maxsize=ODDS_CACHE_SIZE)
+def exact_odds(counts: Tuple[int, ...]) -> Dict:
+    """슈 구성에 대한 정확한 결과 확률과 베팅별 기대값
+    
+    Args:
+        counts: 값 0~9별 남은 장수 (튜플)
+    
+    Returns:
+        {
+            'probabilities': {승자: Fraction},
+            'ev': {베팅 타입: 1원당 기대 손익(float)}
+        }
+    """
+    c = counts
+    total = sum(c)
+    if total < 6:
+        raise ValueError("카드가 6장 이상 남아 있어야 합니다.")
+    
+    # 모든 라운드를 6장 순열 기준 분자로 맞춤 (4장/5장 라운드는 남은 장수를 곱함)
+    scale4 = (total - 4) * (total - 5)
+    scale5 = total - 5
+    
+    # base[b][p]: 남은 카드 전체로 뱅커 합 b에 한 장을 더했을 때 플레이어 합 p 대비
+    #   (플레이어 승, 뱅커 승, 무승부) 장수
+    base = [[None] * 10 for _ in range(10)]
+    for b in range(10):
+        for p in range(10):
+            row = [0, 0, 0]
+            outcome_row = OUTCOME[p]
+            for v in range(10):
+                row[outcome_row[(b + v) % 10]] += c[v]
+            base[b][p] = row
+    
+    player_weight = banker_weight = tie_weight = 0
+    
+    for p1, p2, player_orders in _PAIRS:
+        first = c[p1] * (c[p2] - (p1 == p2)) * player_orders
+        if first <= 0:
+            continue
+        player_total = (p1 + p2) % 10
+        
+        for b1, b2, banker_orders in _PAIRS:
+            third = c[b1] - (b1 == p1) - (b1 == p2)
+            fourth = c[b2] - (b2 == p1) - (b2 == p2) - (b2 == b1)
+            if third <= 0 or fourth <= 0:
+                continue
+            weight = first * third * fourth * banker_orders
+            banker_total = (b1 + b2) % 10
+            
+            # 내추럴, 또는 플레이어 스탠드 + 뱅커 스탠드 (4장)
+            if player_total >= 8 or banker_total >= 8 or (player_total > 5 and banker_total > 2):
+                outcome = OUTCOME[player_total][banker_total]
+                if outcome == PLAYER:
+                    player_weight += weight * scale4
+                elif outcome == BANKER:
+                    banker_weight += weight * scale4
+                else:
+                    tie_weight += weight * scale4
+                continue
+            
+            draws_offset = banker_total * 11
+            base_row = base[banker_total]
+            # 이미 나온 4장이 뱅커 세 번째 카드로 만들었을 합
+            removed_totals = ((banker_total + p1) % 10, (banker_total + p2) % 10,
+                              (banker_total + b1) % 10, (banker_total + b2) % 10)
+            
+            # 플레이어 스탠드 + 뱅커 드로우 (5장)
+            if player_total > 5:
+                outcome_row = OUTCOME[player_total]
+                player_count, banker_count, tie_count = base_row[player_total]
+                for card_total in removed_totals:
+                    outcome = outcome_row[card_total]
+                    if outcome == PLAYER:
+                        player_count -= 1
+                    elif outcome == BANKER:
+                        banker_count -= 1
+                    else:
+                        tie_count -= 1
+                scaled = weight * scale5
+                player_weight += scaled * player_count
+                banker_weight += scaled * banker_count
+                tie_weight += scaled * tie_count
+                continue
+            
+            # 플레이어 세 번째 카드
+            for v3 in range(10):
+                fifth = c[v3] - (v3 == p1) - (v3 == p2) - (v3 == b1) - (v3 == b2)
+                if fifth <= 0:
+                    continue
+                final_player = (player_total + v3) % 10
+                outcome_row = OUTCOME[final_player]
+                
+                if BANKER_DRAW_TABLE[draws_offset + v3]:
+                    # 뱅커 드로우 (6장)
+                    player_count, banker_count, tie_count = base_row[final_player]
+                    for card_total in removed_totals + ((banker_total + v3) % 10,):
+                        outcome = outcome_row[card_total]
+                        if outcome == PLAYER:
+                            player_count -= 1
+                        elif outcome == BANKER:
+                            banker_count -= 1
+                        else:
+                            tie_count -= 1
+                    scaled = weight * fifth
+                    player_weight += scaled * player_count
+                    banker_weight += scaled * banker_count
+                    tie_weight += scaled * tie_count
+                else:
+                    # 뱅커 스탠드 (5장)
+                    outcome = outcome_row[banker_total]
+                    if outcome == PLAYER:
+                        player_weight += weight * fifth * scale5
+                    elif outcome == BANKER:
+                        banker_weight += weight * fifth * scale5
+                    else:
+                        tie_weight += weight * fifth * scale5
+    
+    weights = (player_weight, banker_weight, tie_weight)
+    
+    denominator = 1
+    for i in range(6):
+        denominator *= total - i
+    probabilities = {WINNERS[o]: Fraction(weights[o], denominator) for o in (PLAYER, BANKER, TIE)}
+    
+    ev = {}
+    for bet_type, multiplier in payout_multipliers().items():
+        ev[bet_type] = float(probabilities[bet_type]) * multiplier - 1
+    
+    return {'probabilities': probabilities, 'ev': ev}
+
+# 계산 프로세스 풀과 구성별 결과 {구성: Future} (진행 중인 계산 포함, LRU)
+_pool = None
+_results = OrderedDict()
+
+def _ignore_sigint():
+    # Ctrl+C는 봇 프로세스가 처리하고 풀은 shutdown_odds_pool로 정리
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _executor():
+    global _pool
+    if _pool is None:
+        # 봇 프로세스에는 DB/타이머 스레드가 있으므로 fork 대신 spawn
+        _pool = ProcessPoolExecutor(
+            max_workers=ODDS_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_ignore_sigint
+        )
+    return _pool
+
+async def exact_odds_async(counts: Tuple[int, ...]) -> Dict:
+    """exact_odds를 계산 프로세스에서 실행 (같은 구성은 계산 한 번을 공유)"""
+    counts = tuple(counts)
+    future = _results.get(counts)
+    if future is None:
+        future = asyncio.get_running_loop().run_in_executor(_executor(), exact_odds, counts)
+        _results[counts] = future
+        if len(_results) > ODDS_CACHE_SIZE:
+            _results.popitem(last=False)
+    else:
+        _results.move_to_end(counts)
+    
+    try:
+        return await asyncio.shield(future)
+    except Exception:
+        # 실패한 계산은 다음 요청에서 다시 시도
+        if _results.get(counts) is future:
+            del _results[counts]
+        raise
+
+def shutdown_odds_pool():
+    """계산 프로세스 종료"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+    _results.clear()
+
+def format_odds(counts: Tuple[int, ...], odds: Dict = None) -> str:
+    """확률/기대값 표시 문자열 (odds가 없으면 이 스레드에서 계산)"""
+    if odds is None:
+        odds = exact_odds(tuple(counts))
+    lines = [f"🃏 남은 카드: {sum(counts)}장", ""]
+    for winner, probability in odds['probabilities'].items():
+        lines.append(f"{winner} 승: {float(probability):.3%}")
+    lines.append("")
+    lines.append("💵 베팅별 기대값 (1,000원당):")
+    for bet_type, ev in odds['ev'].items():
+        lines.append(f"{bet_type}: {ev * 1000:+.1f}원")
+    return "\n".join(lines)
+
+def audit_payouts(decks: int = 8):
+    """새 슈 기준 배당표 점검 출력"""
+    composition = shoe_composition(decks)
+    odds = exact_odds(composition)
+    print(f"=== {decks}덱 배당 점검 ===")
+    for winner, probability in odds['probabilities'].items():
+        print(f"{winner} 승: {float(probability):.6%}")
+    for bet_type, ev in odds['ev'].items():
+        print(f"{bet_type} 베팅 하우스 엣지: {-ev:.4%}")
+
+if __name__ == "__main__":
+    audit_payouts()
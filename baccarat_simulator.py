@@ -0,0 +1,157 @@
+"""
+바카라 규칙/배당 검증용 NumPy 몬테카를로 시뮬레이터
+
+라운드를 (N, 6) 카드 값 배열로 한꺼번에 딜하고, baccarat_game.BaccaratGame의
+세 번째 카드 규칙을 벡터 마스크로 적용합니다. 각 라운드는 6장을 미리 뽑아 두고
+플레이어 세 번째 카드는 5번째 카드, 뱅커 세 번째 카드는 플레이어가 뽑았으면
+6번째, 아니면 5번째 카드를 씁니다 (실제 딜 순서와 동일).
+
+카드는 무한 슈(복원 추출)에서 뽑습니다. 남은 슈 구성에 따른 정확한 확률은
+별도의 조합 계산으로 구해야 합니다.
+"""
+
+import sys
+import time
+import numpy as np
+from baccarat_game import (
+    BaccaratGame, NATURAL_TABLE, PLAYER_DRAW_TABLE, BANKER_DRAW_TABLE, PLAYER_STANDS, payout_multipliers,
+)
+
+# 랭크 인덱스(0=A ... 12=K)별 바카라 카드 값
+RANK_VALUES = np.array([1, 2, 3, 4, 5, 6, 7, 8, 9, 0, 0, 0, 0], dtype=np.uint8)
+
+# baccarat_game 규칙표 (인덱스 배열로 조회)
+NATURAL = np.frombuffer(NATURAL_TABLE, dtype=np.uint8).astype(bool)
+PLAYER_DRAWS = np.frombuffer(PLAYER_DRAW_TABLE, dtype=np.uint8).astype(bool)
+BANKER_DRAWS = np.frombuffer(BANKER_DRAW_TABLE, dtype=np.uint8).astype(bool)
+
+CHUNK_SIZE = 1 << 18  # 캐시에 맞는 크기로 나눠 처리
+
+def deal_ranks(rng, rounds):
+    """라운드별 6장의 랭크 인덱스 (rounds, 6)"""
+    return rng.integers(0, 13, size=(rounds, 6), dtype=np.uint8)
+
+def play_rounds(ranks):
+    """벡터화된 라운드 진행
+    
+    Args:
+        ranks: deal_ranks 결과 (rounds, 6)
+    
+    Returns:
+        (player_total, banker_total) uint8 배열
+    """
+    cards = RANK_VALUES[ranks]
+    player_total = (cards[:, 0] + cards[:, 2]) % 10
+    banker_total = (cards[:, 1] + cards[:, 3]) % 10
+    
+    # 내추럴 (8 또는 9)이면 추가 카드 없음
+    natural = NATURAL[player_total * 10 + banker_total]
+    
+    # 플레이어 세 번째 카드: 5 이하
+    player_draws = ~natural & PLAYER_DRAWS[player_total]
+    player_third = cards[:, 4]
+    player_total = np.where(player_draws, (player_total + player_third) % 10, player_total)
+    
+    # 뱅커 세 번째 카드: 뱅커 합 × 플레이어 세 번째 카드 값 (스탠드면 PLAYER_STANDS) 규칙표
+    third_index = np.where(player_draws, player_third, PLAYER_STANDS)
+    banker_draws = ~natural & BANKER_DRAWS[banker_total * 11 + third_index]
+    banker_third = np.where(player_draws, cards[:, 5], cards[:, 4])
+    banker_total = np.where(banker_draws, (banker_total + banker_third) % 10, banker_total)
+    
+    return player_total, banker_total
+
+def simulate(rounds, seed=None, chunk_size=CHUNK_SIZE):
+    """rounds 라운드를 시뮬레이션하고 통계 반환
+    
+    Returns:
+        {
+            'rounds': int, 'seconds': float, 'rounds_per_second': float,
+            'frequency': {승자: 비율},
+            'bets': {베팅 타입: {'ev': 기대 손익, 'house_edge': 하우스 엣지, 'variance': 분산}}
+        }
+    """
+    rng = np.random.default_rng(seed)
+    wins = {"플레이어": 0, "뱅커": 0, "무승부": 0}
+    
+    started = time.perf_counter()
+    done = 0
+    while done < rounds:
+        size = min(chunk_size, rounds - done)
+        player_total, banker_total = play_rounds(deal_ranks(rng, size))
+        player_wins = int(np.count_nonzero(player_total > banker_total))
+        ties = int(np.count_nonzero(player_total == banker_total))
+        wins["플레이어"] += player_wins
+        wins["무승부"] += ties
+        wins["뱅커"] += size - player_wins - ties
+        done += size
+    seconds = time.perf_counter() - started
+    
+    frequency = {winner: count / rounds for winner, count in wins.items()}
+    
+    # 1원 베팅의 순손익: 당첨 시 (배수 - 1), 그 외 -1 (무승부 시 플레이어/뱅커 베팅도 패배)
+    bets = {}
+    for bet_type, multiplier in payout_multipliers().items():
+        win_rate = frequency[bet_type]
+        ev = win_rate * multiplier - 1
+        bets[bet_type] = {
+            'ev': ev,
+            'house_edge': -ev,
+            'variance': multiplier * multiplier * win_rate * (1 - win_rate)
+        }
+    
+    return {
+        'rounds': rounds,
+        'seconds': seconds,
+        'rounds_per_second': rounds / seconds if seconds else float('inf'),
+        'frequency': frequency,
+        'bets': bets
+    }
+
+class _FixedShoe:
+    """정해진 순서로 카드를 내주는 슈 (스칼라 엔진 검증용)"""
+    def __init__(self, codes):
+        self.codes = codes
+        self.position = 0
+    
+    def deal_card(self):
+        card = self.codes[self.position]
+        self.position += 1
+        return card
+
+def verify_against_scalar(rounds=100000, seed=0):
+    """같은 시드의 카드로 스칼라 엔진(BaccaratGame.play_round)과 결과 비교
+    
+    Returns:
+        일치하지 않은 라운드 수
+    """
+    rng = np.random.default_rng(seed)
+    ranks = deal_ranks(rng, rounds)
+    player_total, banker_total = play_rounds(ranks)
+    
+    game = BaccaratGame()
+    mismatches = 0
+    # 랭크 인덱스는 스페이드 카드 코드와 같음
+    for row, expected_player, expected_banker in zip(ranks.tolist(), player_total.tolist(), banker_total.tolist()):
+        result = game.play_round(_FixedShoe(row))
+        if result['player_total'] != expected_player or result['banker_total'] != expected_banker:
+            mismatches += 1
+    return mismatches
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 2024
+    
+    print("=== 바카라 몬테카를로 시뮬레이션 ===")
+    mismatches = verify_against_scalar(seed=seed)
+    print(f"스칼라 엔진 대조 (100,000 라운드): 불일치 {mismatches}건")
+    
+    report = simulate(rounds, seed=seed)
+    print(f"\n{report['rounds']:,} 라운드 / {report['seconds']:.2f}초 ({report['rounds_per_second']:,.0f} 라운드/초)")
+    for winner, rate in report['frequency'].items():
+        print(f"{winner} 승: {rate:.4%}")
+    print()
+    for bet_type, stats in report['bets'].items():
+        print(f"{bet_type} 베팅: 하우스 엣지 {stats['house_edge']:.4%}, 분산 {stats['variance']:.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+user_stats 재계산 도구
+
+game_history를 한 번 훑어 (user_id, bet_type)별로 집계한 결과로 user_stats를 바꿉니다.
+삭제와 재계산을 한 트랜잭션에서 하므로 봇이 실행 중이어도 정산 갱신과 어긋나지 않습니다.
+(v3 마이그레이션이 기존 DB에 처음 적용될 때도 같은 집계로 채워집니다.)
+
+    python backfill_stats.py --db baccarat_bot.db
+"""
+
+import sys
+import time
+import argparse
+from database import Database
+from config import DATABASE_PATH
+
+def main():
+    parser = argparse.ArgumentParser(description="게임 기록으로 user_stats 다시 계산")
+    parser.add_argument('--db', default=DATABASE_PATH, help="데이터베이스 경로")
+    args = parser.parse_args()
+    
+    started = time.perf_counter()
+    db = Database(args.db)
+    rows = db.rebuild_user_stats()
+    db.close()
+    print(f"user_stats 재계산 완료: {rows:,}행 ({time.perf_counter() - started:.2f}초)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import os
+import asyncio
+from config import LEDGER_JOURNAL_PATH, LEDGER_FLUSH_INTERVAL, LEDGER_FLUSH_THRESHOLD
+
+class BalanceLedger:
+    """인메모리 잔액 원장 (write-behind)
+    
+    잔액의 기준값은 메모리에 있고, 모든 변경은 먼저 추가 전용 저널에 기록된 뒤
+    주기적으로(또는 변경 건수가 임계값을 넘으면) users 테이블에 일괄 반영됩니다.
+    저널에는 변경 후 잔액을 그대로 기록하므로 재생해도 결과가 같습니다.
+    변경 연산은 저널이 fsync된 뒤에 반환하며, 그 사이 들어온 변경은 한 번의 fsync로
+    함께 기록합니다 (group commit).
+    on_change(user_id, 잔액)가 있으면 모든 변경 직후 호출합니다 (순위표 갱신 등).
+    
+    확인과 변경 사이에 await가 없으므로 각 연산은 이벤트 루프 안에서 원자적입니다.
+    """
+    
+    def __init__(self, db, journal_path=None, on_change=None):
+        self.db = db  # AsyncDatabase
+        self.on_change = on_change
+        self.journal_path = journal_path or LEDGER_JOURNAL_PATH
+        self.balances = {}  # {user_id: balance}
+        self._dirty = {}    # 아직 DB에 반영되지 않은 {user_id: balance}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._flusher_task = None
+        self._written = 0        # 저널에 쓴 항목 수
+        self._synced = 0         # 그중 fsync된 항목 수
+        self._sync_task = None   # 진행 중인 fsync
+        
+        self.replay_journal()
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+    
+    def replay_journal(self):
+        """시작 시 반영되지 않은 저널 항목을 DB에 적용"""
+        if not os.path.exists(self.journal_path):
+            return 0
+        
+        pending = {}
+        with open(self.journal_path, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                parts = line.split()
+                # 기록 도중 중단된 마지막 줄은 건너뜀
+                if len(parts) != 2:
+                    continue
+                try:
+                    pending[int(parts[0])] = int(parts[1])
+                except ValueError:
+                    continue
+        
+        if pending:
+            self.db.sync.set_balances(list(pending.items()))
+            print(f"잔액 저널 복구: {len(pending)}명")
+        
+        os.remove(self.journal_path)
+        return len(pending)
+    
+    async def _load(self, user_id):
+        """사용자 잔액을 메모리로 적재, 사용자가 없으면 False"""
+        if user_id in self.balances:
+            return True
+        
+        user = await self.db.get_user(user_id)
+        if user is None:
+            return False
+        
+        # 적재 중 다른 코루틴이 먼저 적재했으면 그 값을 유지
+        self.balances.setdefault(user_id, user['balance'])
+        return True
+    
+    def _apply(self, user_id, new_balance):
+        """메모리 잔액 변경 + 저널 기록"""
+        self.balances[user_id] = new_balance
+        self._dirty[user_id] = new_balance
+        self._journal.write(f"{user_id} {new_balance}\n")
+        self._journal.flush()
+        self._written += 1
+        if self.on_change:
+            self.on_change(user_id, new_balance)
+        
+        if len(self._dirty) >= LEDGER_FLUSH_THRESHOLD:
+            self._schedule_flush()
+        self._ensure_flusher()
+    
+    async def _commit(self):
+        """지금까지 쓴 저널 항목이 디스크에 기록될 때까지 대기"""
+        target = self._written
+        while self._synced < target:
+            if self._sync_task is None or self._sync_task.done():
+                self._sync_task = asyncio.ensure_future(self._sync())
+            await asyncio.shield(self._sync_task)
+    
+    async def _sync(self):
+        """저널 fsync 한 번 (시작 시점까지 쓴 항목을 모두 포함)"""
+        written = self._written
+        # 압축으로 저널이 바뀌어도 fsync하는 동안 파일이 닫히지 않도록 복제한 fd 사용
+        fd = os.dup(self._journal.fileno())
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, os.fsync, fd)
+        finally:
+            os.close(fd)
+        self._synced = max(self._synced, written)
+    
+    async def get_balance(self, user_id):
+        """잔액 조회 (사용자가 없으면 None)"""
+        if not await self._load(user_id):
+            return None
+        return self.balances[user_id]
+    
+    async def set_balance(self, user_id, new_balance):
+        """잔액 설정"""
+        if not await self._load(user_id):
+            return False
+        self._apply(user_id, new_balance)
+        await self._commit()
+        return True
+    
+    async def credit(self, user_id, amount):
+        """잔액 증가, 변경 후 잔액 반환 (사용자가 없으면 None)"""
+        if not await self._load(user_id):
+            return None
+        new_balance = self.balances[user_id] + amount
+        self._apply(user_id, new_balance)
+        await self._commit()
+        return new_balance
+    
+    async def debit(self, user_id, amount):
+        """잔액이 충분할 때만 차감, 변경 후 잔액 반환 (부족하면 None)"""
+        if not await self._load(user_id):
+            return None
+        balance = self.balances[user_id]
+        if balance < amount:
+            return None
+        self._apply(user_id, balance - amount)
+        await self._commit()
+        return balance - amount
+    
+    async def transfer(self, sender_id, recipient_id, amount):
+        """송금
+        
+        Returns:
+            (송금자 이전 잔액, 송금자 이후 잔액, 수신자 이전 잔액, 수신자 이후 잔액),
+            사용자가 없거나 잔액이 부족하면 None
+        """
+        if not await self._load(sender_id) or not await self._load(recipient_id):
+            return None
+        
+        sender_before = self.balances[sender_id]
+        recipient_before = self.balances[recipient_id]
+        if sender_before < amount:
+            return None
+        
+        self._apply(sender_id, sender_before - amount)
+        self._apply(recipient_id, recipient_before + amount)
+        await self._commit()
+        return sender_before, sender_before - amount, recipient_before, recipient_before + amount
+    
+    async def credit_many(self, credits):
+        """여러 사용자 잔액 일괄 증가
+        
+        Args:
+            credits: [(user_id, amount), ...]
+        
+        Returns:
+            {user_id: 변경 후 잔액} (존재하지 않는 사용자 제외)
+        """
+        for user_id, _ in credits:
+            await self._load(user_id)
+        
+        balances = {}
+        for user_id, amount in credits:
+            if user_id not in self.balances:
+                continue
+            if amount:
+                self._apply(user_id, self.balances[user_id] + amount)
+            balances[user_id] = self.balances[user_id]
+        await self._commit()
+        return balances
+    
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+    
+    def _ensure_flusher(self):
+        if self._flusher_task is None or self._flusher_task.done():
+            self._flusher_task = asyncio.create_task(self._periodic_flush())
+    
+    async def _periodic_flush(self):
+        """주기적 DB 반영"""
+        try:
+            while True:
+                await asyncio.sleep(LEDGER_FLUSH_INTERVAL)
+                await self.flush()
+        except asyncio.CancelledError:
+            pass
+    
+    async def flush(self):
+        """변경된 잔액을 users 테이블에 일괄 반영하고 저널 압축"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            
+            dirty, self._dirty = self._dirty, {}
+            try:
+                await self.db.set_balances(list(dirty.items()))
+            except Exception as e:
+                # 반영 실패 시 그 사이 더 새 값이 없는 항목만 되돌림
+                for user_id, balance in dirty.items():
+                    self._dirty.setdefault(user_id, balance)
+                print(f"잔액 반영 오류: {e}")
+                return
+            
+            self._compact_journal()
+    
+    def _compact_journal(self):
+        """DB에 반영된 항목을 저널에서 제거 (아직 남은 변경만 다시 기록)"""
+        self._journal.close()
+        temp_path = self.journal_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as journal:
+            journal.writelines(f"{user_id} {balance}\n" for user_id, balance in self._dirty.items())
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temp_path, self.journal_path)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        # 남은 변경은 새 저널에 fsync되었고 나머지는 DB에 반영됨
+        self._synced = self._written
+    
+    async def close(self):
+        """남은 변경 반영 후 종료"""
+        if self._flusher_task:
+            self._flusher_task.cancel()
+        await self.flush()
+        self._journal.close()
@@ -0,0 +1,308 @@
+"""
+바카라 봇 성능 벤치마크
+
+게임 엔진, 라운드 정산, 저장소의 주요 경로를 고정 시드로 측정하고 결과를 JSON으로
+저장합니다. 기준 결과(--baseline)를 주면 항목별 중앙값을 비교해 허용 범위를 넘게
+느려진 항목이 있으면 종료 코드 1을 반환합니다 (배포 전 회귀 확인용).
+
+    python benchmark.py --output benchmark.json
+    python benchmark.py --baseline benchmark.json --threshold 0.2
+
+DB를 쓰는 항목은 임시 디렉터리의 별도 파일을 사용하므로 운영 DB에 영향이 없습니다.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import datetime
+import tempfile
+import statistics
+from baccarat_game import BaccaratGame, Shoe
+from database import Database
+from user_service import UserService
+from game_manager import GameManager, GameSession
+from config import INITIAL_BALANCE
+
+SEED = 2024
+HISTORY_ROWS = 1_000_000
+HISTORY_USERS = 1000
+BET_TYPES = ("플레이어", "뱅커", "무승부")
+DISPATCHER_CLOSE_TIMEOUT = 10  # 정산 벤치마크 후 발신 디스패처 종료 대기 (초)
+
+class _Message:
+    def __init__(self, message_id):
+        self.message_id = message_id
+
+class FakeBot:
+    """Bot API를 호출하지 않고 전송 결과만 돌려주는 가짜 봇"""
+    def __init__(self):
+        self.sent_count = 0
+    
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent_count += 1
+        return _Message(self.sent_count)
+    
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self.sent_count += 1
+        return _Message(message_id)
+
+class FakeApplication:
+    def __init__(self):
+        self.bot = FakeBot()
+
+def _summary(samples, operations):
+    """반복 측정값(초)을 1회당 마이크로초 통계로 변환"""
+    per_op = [sample / operations * 1e6 for sample in samples]
+    median = statistics.median(per_op)
+    return {
+        'unit': 'us/op',
+        'operations': operations,
+        'repeat': len(samples),
+        'best': min(per_op),
+        'median': median,
+        'ops_per_sec': 1e6 / median if median else float('inf')
+    }
+
+def measure(func, operations, repeat=5):
+    """func()를 repeat번 실행 (func는 operations회 작업을 수행)"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return _summary(samples, operations)
+
+# ---------------------------------------------------------------- 게임 엔진
+
+def bench_play_round(results):
+    game = BaccaratGame()
+    shoe = Shoe()
+    rounds = 100_000
+    
+    def run():
+        play_round = game.play_round
+        for _ in range(rounds):
+            play_round(shoe)
+    
+    results['play_round'] = measure(run, rounds)
+
+def bench_bet_status(results):
+    """배팅 현황 렌더링 (배팅 변경 직후 / 변경 없음)"""
+    for bettors in (10, 1000):
+        session = GameSession(chat_id=1)
+        for user_id in range(bettors):
+            session.add_bet(user_id, f"user{user_id}", random.choice(BET_TYPES), random.randint(1, 100) * 1000)
+        
+        updates = 1000
+        
+        def changed():
+            for i in range(updates):
+                user_id = i % bettors
+                session.add_bet(user_id, f"user{user_id}", BET_TYPES[i % 3], (i % 100 + 1) * 1000)
+                session.get_bet_status()
+        
+        def cached():
+            for _ in range(updates):
+                session.get_bet_status()
+        
+        results[f'get_bet_status_changed_{bettors}'] = measure(changed, updates)
+        results[f'get_bet_status_cached_{bettors}'] = measure(cached, updates)
+
+# ---------------------------------------------------------------- 정산
+
+async def _bench_end_game(results, workdir):
+    service = UserService(os.path.join(workdir, 'end_game.db'), os.path.join(workdir, 'end_game.ledger'))
+    manager = GameManager(FakeApplication(), service, journal_path=os.path.join(workdir, 'end_game.sessions'))
+    
+    max_bettors = 1000
+    for user_id in range(1, max_bettors + 1):
+        await service.register_user(user_id, f"user{user_id}")
+        await service.update_balance(user_id, 10**12)  # 반복 라운드 동안 잔액이 모자라지 않도록
+    
+    for bettors in (1, 100, 1000):
+        chat_id = -bettors
+        
+        async def run_round():
+            session = GameSession(chat_id)
+            for user_id in range(1, bettors + 1):
+                bet_type = BET_TYPES[user_id % 3]
+                amount = 1000
+                await service.reserve_bet(user_id, amount)
+                session.add_bet(user_id, f"user{user_id}", bet_type, amount)
+            manager.active_sessions[chat_id] = session
+            
+            started = time.perf_counter()
+            await manager.end_game(chat_id)
+            return time.perf_counter() - started
+        
+        # 배팅 등록 시간은 빼고 end_game만 측정
+        samples = [await run_round() for _ in range(20)]
+        results[f'end_game_{bettors}'] = _summary(samples, 1)
+    
+    # 결과 메시지 전송은 측정 대상이 아님: 바로 종료하고, 멈추면 측정 실패로 처리
+    try:
+        await asyncio.wait_for(manager.dispatcher.close(timeout=0), DISPATCHER_CLOSE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise RuntimeError(f"발신 디스패처가 {DISPATCHER_CLOSE_TIMEOUT}초 안에 종료되지 않았습니다.") from None
+    worker = manager.dispatcher._worker
+    if worker is not None and not worker.done():
+        raise RuntimeError("발신 디스패처 워커가 종료 후에도 실행 중입니다.")
+    manager.journal.close()
+    await service.close()
+    service.db.close()
+
+def bench_end_game(results, workdir):
+    asyncio.run(_bench_end_game(results, workdir))
+
+# ---------------------------------------------------------------- 저장소
+
+def bench_database_crud(results, workdir):
+    db = Database(os.path.join(workdir, 'crud.db'))
+    operations = 2000
+    
+    next_id = iter(range(1, 10**9))
+    
+    def create():
+        for _ in range(operations):
+            db.create_user(next(next_id), "crud")
+    
+    def read():
+        for i in range(operations):
+            db.get_user(i % operations + 1)
+    
+    def update():
+        for i in range(operations):
+            db.update_balance(i % operations + 1, INITIAL_BALANCE + i)
+    
+    def insert_history():
+        for i in range(operations):
+            user_id = i % operations + 1
+            db.add_game_record(user_id, 1000, "뱅커", "♠A ♥2", "♦3 ♣4", 3, 7, "뱅커", 1950,
+                               INITIAL_BALANCE, INITIAL_BALANCE + 950)
+    
+    results['db_create_user'] = measure(create, operations)
+    results['db_get_user'] = measure(read, operations)
+    results['db_update_balance'] = measure(update, operations)
+    results['db_add_game_record'] = measure(insert_history, operations)
+    db.close()
+
+def _populate_history(db, rows, users):
+    """game_history에 rows개 기록 채우기 (users명에게 고르게 분배)"""
+    conn = db.get_connection()
+    with conn:
+        conn.executemany(
+            'INSERT OR IGNORE INTO users (user_id, username, balance) VALUES (?, ?, ?)',
+            ((user_id, f"user{user_id}", INITIAL_BALANCE) for user_id in range(1, users + 1))
+        )
+    
+    batch = 50_000
+    for start in range(0, rows, batch):
+        with conn:
+            conn.executemany('''
+                INSERT INTO game_history
+                (user_id, bet_amount, bet_type, player_cards, banker_cards, player_total,
+                 banker_total, winner, payout, balance_before, balance_after)
+                VALUES (?, 1000, ?, '♠A ♥2', '♦3 ♣4', 3, 7, '뱅커', ?, ?, ?)
+            ''', (
+                (i % users + 1, BET_TYPES[i % 3], 1950 if i % 3 == 1 else 0, INITIAL_BALANCE, INITIAL_BALANCE)
+                for i in range(start, min(start + batch, rows))
+            ))
+
+def bench_game_history(results, workdir, rows):
+    db = Database(os.path.join(workdir, 'history.db'))
+    started = time.perf_counter()
+    _populate_history(db, rows, HISTORY_USERS)
+    print(f"  game_history {rows:,}행 준비: {time.perf_counter() - started:.1f}초")
+    
+    operations = 2000
+    user_ids = [random.randint(1, HISTORY_USERS) for _ in range(operations)]
+    
+    def run():
+        for user_id in user_ids:
+            db.get_game_history(user_id, 10)
+    
+    results[f'get_game_history_{rows}'] = measure(run, operations)
+    db.close()
+
+# ---------------------------------------------------------------- 실행/비교
+
+def run_benchmarks(only=None, history_rows=HISTORY_ROWS):
+    """모든 벤치마크 실행 (only: 실행할 그룹 이름 목록)"""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="baccarat-bench-") as workdir:
+        groups = [
+            ('engine', lambda: (bench_play_round(results), bench_bet_status(results))),
+            ('settlement', lambda: bench_end_game(results, workdir)),
+            ('storage', lambda: (bench_database_crud(results, workdir),
+                                 bench_game_history(results, workdir, history_rows))),
+        ]
+        for name, run in groups:
+            if only and name not in only:
+                continue
+            print(f"[{name}]")
+            random.seed(SEED)
+            run()
+    
+    return {
+        'meta': {
+            'seed': SEED,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds')
+        },
+        'results': results
+    }
+
+def compare(report, baseline, threshold):
+    """기준 결과와 중앙값 비교, 회귀 항목 목록 반환"""
+    regressions = []
+    for name, current in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        ratio = current['median'] / previous['median'] if previous['median'] else float('inf')
+        mark = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            mark = "  ⚠️ 회귀"
+        print(f"{name:36} {previous['median']:12.2f} → {current['median']:12.2f} us/op ({ratio:.2f}x){mark}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="바카라 봇 성능 벤치마크")
+    parser.add_argument('--output', help="결과 JSON 저장 경로")
+    parser.add_argument('--baseline', help="비교할 기준 결과 JSON")
+    parser.add_argument('--threshold', type=float, default=0.2, help="허용 감속 비율 (기본 0.2 = 20%%)")
+    parser.add_argument('--only', nargs='+', choices=('engine', 'settlement', 'storage'), help="실행할 그룹")
+    parser.add_argument('--history-rows', type=int, default=HISTORY_ROWS, help="get_game_history 테이블 크기")
+    args = parser.parse_args()
+    
+    report = run_benchmarks(args.only, args.history_rows)
+    
+    print()
+    for name, stats in report['results'].items():
+        print(f"{name:36} {stats['median']:12.2f} us/op  ({stats['ops_per_sec']:,.0f}/s)")
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n결과 저장: {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n=== 기준 결과 비교 (허용 {args.threshold:.0%}) ===")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n회귀 {len(regressions)}건: {', '.join(regressions)}")
+            return 1
+        print("\n회귀 없음")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,19 @@
+import os
 import logging
+import importlib.util
 import asyncio
+import secrets
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
-from config import BOT_TOKEN, MESSAGES, MIN_BET, MAX_BET, DAILY_ATTENDANCE_REWARD, WEEKLY_BONUS
+from config import (BOT_TOKEN, MESSAGES, MIN_BET, MAX_BET, DAILY_ATTENDANCE_REWARD, WEEKLY_BONUS, GAME_TIMER,
+                    METRICS_ENABLED, METRICS_HOST, METRICS_PORT, UPDATE_MODE, UPDATE_QUEUE_SIZE,
+                    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN,
+                    WEBHOOK_MAX_CONNECTIONS, CONCURRENT_UPDATES, SHARD_WORKERS)
 from user_service import UserService
 from game_manager import GameManager
+from baccarat_odds import format_odds, exact_odds_async, shutdown_odds_pool
+from metrics import track_handler, start_metrics_server
+from profiling import profiled, install_signal_handlers
 
 # 로깅 설정
 logging.basicConfig(
@@ -13,28 +22,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# 전역 서비스 인스턴스
-user_service = UserService()
-game_manager = None  # 나중에 초기화
+# 봇이 처리하는 업데이트 종류만 수신
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# 전역 서비스 인스턴스 (build_application에서 초기화)
+user_service = None
+game_manager = None
 
 class BotHandler:
     """텔레그램 봇 핸들러 클래스"""
     
     @staticmethod
+    @track_handler
+    @profiled
     async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """시작 명령어 처리"""
         user = update.effective_user
         user_id = user.id
         
         # 사용자 등록
-        user_service.register_user(
+        await user_service.register_user(
             user_id=user_id,
             username=user.username,
             first_name=user.first_name,
             last_name=user.last_name
         )
         
-        balance = user_service.get_balance(user_id)
+        balance = await user_service.get_balance(user_id)
         welcome_message = MESSAGES['welcome'].format(balance=f"{balance:,}")
         
         # 메인 메뉴 키보드
@@ -50,13 +64,17 @@ class BotHandler:
         await update.message.reply_text(welcome_message, reply_markup=reply_markup)
     
     @staticmethod
+    @track_handler
+    @profiled
     async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """잔액 확인 명령어"""
         user_id = update.effective_user.id
-        balance_info = user_service.format_balance_info(user_id)
+        balance_info = await user_service.format_balance_info(user_id)
         await update.message.reply_text(balance_info)
     
     @staticmethod
+    @track_handler
+    @profiled
     async def transfer_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """송금 명령어"""
         user_id = update.effective_user.id
@@ -69,10 +87,10 @@ class BotHandler:
             recipient_username = context.args[0]
             amount = int(context.args[1])
             
-            success, message = user_service.transfer_money(user_id, recipient_username, amount)
+            success, message = await user_service.transfer_money(user_id, recipient_username, amount)
             
             if success:
-                balance = user_service.get_balance(user_id)
+                balance = await user_service.get_balance(user_id)
                 response = MESSAGES['transfer_success'].format(
                     recipient=recipient_username,
                     amount=f"{amount:,}",
@@ -87,22 +105,73 @@ class BotHandler:
             await update.message.reply_text(MESSAGES['transfer_request'])
     
     @staticmethod
+    @track_handler
+    @profiled
     async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """게임 기록 명령어"""
         user_id = update.effective_user.id
-        history = user_service.format_game_history(user_id)
-        await update.message.reply_text(history)
+        history, older_id, newer_id = await user_service.format_game_history(user_id)
+        keyboard = BotHandler.history_keyboard(user_id, older_id, newer_id)
+        await update.message.reply_text(history, reply_markup=InlineKeyboardMarkup(keyboard) if keyboard else None)
+    
+    @staticmethod
+    def history_keyboard(user_id, older_id, newer_id):
+        """게임 기록 페이지 이동 버튼 (callback_data: history:<user_id>:<older|newer>:<기준 id>)"""
+        row = []
+        if newer_id is not None:
+            row.append(InlineKeyboardButton("◀️ 최근 기록", callback_data=f"history:{user_id}:newer:{newer_id}"))
+        if older_id is not None:
+            row.append(InlineKeyboardButton("이전 기록 ▶️", callback_data=f"history:{user_id}:older:{older_id}"))
+        return [row] if row else []
+    
+    @staticmethod
+    @track_handler
+    @profiled
+    async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """게임 통계 명령어"""
+        user_id = update.effective_user.id
+        stats = await user_service.format_user_stats(user_id)
+        await update.message.reply_text(stats)
+    
+    @staticmethod
+    def leaderboard_scope(update: Update, args):
+        """순위표 대상 채팅 (개인 채팅이거나 '전체/all' 인자가 있으면 None = 전체 순위)"""
+        chat = update.effective_chat
+        if chat.type == chat.PRIVATE or any(arg.lower() in ('전체', 'all') for arg in args):
+            return None
+        return chat.id
+    
+    @staticmethod
+    @track_handler
+    @profiled
+    async def top_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """순위표 명령어 (/top [수익] [전체])"""
+        args = context.args or []
+        board = 'profit' if any(arg.lower() in ('수익', '순이익', 'profit') for arg in args) else 'balance'
+        text = await user_service.format_leaderboard(BotHandler.leaderboard_scope(update, args), board)
+        await update.message.reply_text(text)
+    
+    @staticmethod
+    @track_handler
+    @profiled
+    async def rank_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """내 순위 명령어 (/rank [전체])"""
+        user_id = update.effective_user.id
+        text = await user_service.format_rank(user_id, BotHandler.leaderboard_scope(update, context.args or []))
+        await update.message.reply_text(text)
     
     @staticmethod
+    @track_handler
+    @profiled
     async def attendance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """출석 체크 명령어"""
         user_id = update.effective_user.id
         
         try:
-            success, message, consecutive_days, *extra = user_service.check_attendance(user_id)
+            success, message, consecutive_days, *extra = await user_service.check_attendance(user_id)
             
             if success:
-                current_balance = extra[0] if extra else user_service.get_balance(user_id)
+                current_balance = extra[0] if extra else await user_service.get_balance(user_id)
                 response = MESSAGES['attendance_success'].format(
                     reward=DAILY_ATTENDANCE_REWARD + (WEEKLY_BONUS if consecutive_days % 7 == 0 else 0),
                     streak=consecutive_days,
@@ -121,11 +190,24 @@ class BotHandler:
             logger.error(f"출석 체크 오류: {e}")
     
     @staticmethod
+    @track_handler
+    @profiled
     async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """도움말 명령어"""
         await update.message.reply_text(MESSAGES['help'])
     
     @staticmethod
+    @track_handler
+    @profiled
+    async def odds_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """현재 슈 기준 확률/기대값 명령어"""
+        counts = game_manager.get_shoe(update.effective_chat.id).remaining_counts()
+        # 새 구성은 계산에 수십 ms가 걸리므로 별도 프로세스에서 계산 (GIL을 잡지 않음)
+        text = format_odds(counts, await exact_odds_async(counts))
+        await update.message.reply_text(text)
+    
+    @staticmethod
+    @profiled
     async def bet_command(update: Update, context: ContextTypes.DEFAULT_TYPE, bet_type: str):
         """배팅 명령어 처리"""
         user_id = update.effective_user.id
@@ -140,13 +222,11 @@ class BotHandler:
             amount = int(context.args[0].replace(',', ''))
             
             # 게임 매니저를 통해 배팅 처리
-            success, message = await game_manager.start_game(chat_id, user_id, username, bet_type, amount)
+            success, message, current_balance = await game_manager.start_game(
+                chat_id, user_id, username, bet_type, amount
+            )
             
             if success:
-                # 잔액에서 배팅 금액 차감 (임시)
-                user_service.subtract_balance(user_id, amount)
-                current_balance = user_service.get_balance(user_id)
-                
                 if "새 게임" in message:
                     response = f"🎮 새 게임이 시작되었습니다!\n✅ {bet_type} {amount:,}원 배팅\n💰 잔액: {current_balance:,}원\n\n⏰ 60초 후 결과 발표!"
                 else:
@@ -167,21 +247,29 @@ class BotHandler:
             logger.error(f"배팅 오류: {e}")
     
     @staticmethod
+    @track_handler
+    @profiled
     async def player_bet_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """플레이어 배팅 명령어"""
         await BotHandler.bet_command(update, context, "플레이어")
     
     @staticmethod
+    @track_handler
+    @profiled
     async def banker_bet_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """뱅커 배팅 명령어"""
         await BotHandler.bet_command(update, context, "뱅커")
     
     @staticmethod
+    @track_handler
+    @profiled
     async def tie_bet_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """무승부 배팅 명령어"""
         await BotHandler.bet_command(update, context, "무승부")
     
     @staticmethod
+    @track_handler
+    @profiled
     async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """인라인 키보드 버튼 콜백"""
         query = update.callback_query
@@ -201,12 +289,14 @@ class BotHandler:
             await BotHandler.help_callback(update, context)
         elif callback_data == "main_menu":
             await BotHandler.main_menu_callback(update, context)
+        elif callback_data.startswith("history:"):
+            await BotHandler.history_page_callback(update, context)
     
     @staticmethod
     async def check_balance_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """잔액 확인 콜백"""
         user_id = update.effective_user.id
-        balance_info = user_service.format_balance_info(user_id)
+        balance_info = await user_service.format_balance_info(user_id)
         
         keyboard = [[InlineKeyboardButton("🏠 메인 메뉴", callback_data="main_menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -227,9 +317,31 @@ class BotHandler:
     async def game_history_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """게임 기록 콜백"""
         user_id = update.effective_user.id
-        history = user_service.format_game_history(user_id)
+        history, older_id, newer_id = await user_service.format_game_history(user_id)
         
-        keyboard = [[InlineKeyboardButton("🏠 메인 메뉴", callback_data="main_menu")]]
+        keyboard = BotHandler.history_keyboard(user_id, older_id, newer_id)
+        keyboard.append([InlineKeyboardButton("🏠 메인 메뉴", callback_data="main_menu")])
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await update.callback_query.edit_message_text(history, reply_markup=reply_markup)
+    
+    @staticmethod
+    async def history_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """게임 기록 페이지 이동 콜백"""
+        _, owner_id, direction, cursor = update.callback_query.data.split(":")
+        user_id = update.effective_user.id
+        
+        # 그룹에서 다른 사람의 기록 메시지 버튼은 무시
+        if int(owner_id) != user_id:
+            return
+        
+        if direction == "older":
+            history, older_id, newer_id = await user_service.format_game_history(user_id, before_id=int(cursor))
+        else:
+            history, older_id, newer_id = await user_service.format_game_history(user_id, after_id=int(cursor))
+        
+        keyboard = BotHandler.history_keyboard(user_id, older_id, newer_id)
+        keyboard.append([InlineKeyboardButton("🏠 메인 메뉴", callback_data="main_menu")])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await update.callback_query.edit_message_text(history, reply_markup=reply_markup)
@@ -240,10 +352,10 @@ class BotHandler:
         user_id = update.effective_user.id
         
         try:
-            success, message, consecutive_days, *extra = user_service.check_attendance(user_id)
+            success, message, consecutive_days, *extra = await user_service.check_attendance(user_id)
             
             if success:
-                current_balance = extra[0] if extra else user_service.get_balance(user_id)
+                current_balance = extra[0] if extra else await user_service.get_balance(user_id)
                 response = MESSAGES['attendance_success'].format(
                     reward=DAILY_ATTENDANCE_REWARD + (WEEKLY_BONUS if consecutive_days % 7 == 0 else 0),
                     streak=consecutive_days,
@@ -276,7 +388,7 @@ class BotHandler:
     async def main_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """메인 메뉴 콜백"""
         user_id = update.effective_user.id
-        balance = user_service.get_balance(user_id)
+        balance = await user_service.get_balance(user_id)
         welcome_message = MESSAGES['welcome'].format(balance=f"{balance:,}")
         
         keyboard = [
@@ -291,6 +403,8 @@ class BotHandler:
         await update.callback_query.edit_message_text(welcome_message, reply_markup=reply_markup)
     
     @staticmethod
+    @track_handler
+    @profiled
     async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """일반 메시지 처리"""
         text = update.message.text
@@ -304,23 +418,65 @@ class BotHandler:
             "또는 /help로 전체 도움말을 확인하세요."
         )
 
-def main():
-    """메인 함수"""
-    global game_manager
+async def post_init(application: Application):
+    """시작 시 순위표를 DB에서 재구성하고 재시작/장애로 중단된 게임 세션 복구"""
+    await user_service.load_rankings()
+    await game_manager.restore_sessions()
+
+async def post_stop(application: Application):
+    """종료 시 대기 중인 발신 메시지 전송 (Bot 연결이 닫히기 전)"""
+    await game_manager.dispatcher.close()
+
+async def post_shutdown(application: Application):
+    """종료 시 메모리 잔액 원장을 DB에 반영하고 확률 계산 프로세스 정리"""
+    await user_service.close()
+    game_manager.journal.close()
+    shutdown_odds_pool()
+
+def build_application(token=BOT_TOKEN, base_url=None, service=None, game_timer=None, session_journal_path=None):
+    """애플리케이션 생성 및 핸들러 등록
+    
+    Args:
+        token: 봇 토큰
+        base_url: Bot API 주소 (기본값 https://api.telegram.org/bot, 로컬 테스트 서버 등)
+        service: 사용할 UserService (기본값은 config의 DB)
+        game_timer: 배팅 시간 (초, 기본값 GAME_TIMER)
+        session_journal_path: 게임 세션 저널 경로 (기본값 SESSION_JOURNAL_PATH)
+    """
+    global user_service, game_manager
     
-    # 애플리케이션 생성
-    application = Application.builder().token(BOT_TOKEN).build()
+    user_service = service or UserService()
+    
+    # 애플리케이션 생성 (업데이트 큐가 가득 차면 폴링/웹훅 수신이 기다림)
+    builder = (
+        Application.builder()
+        .token(token)
+        .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if CONCURRENT_UPDATES:
+        # 같은 사용자/채팅의 작업은 UserService/GameManager의 키별 잠금으로 직렬화
+        builder = builder.concurrent_updates(CONCURRENT_UPDATES)
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
     
     # 게임 매니저 초기화
-    game_manager = GameManager(application)
+    game_manager = GameManager(application, user_service, game_timer or GAME_TIMER, session_journal_path)
     
     # 핸들러 등록
     application.add_handler(CommandHandler("start", BotHandler.start_command))
     application.add_handler(CommandHandler("balance", BotHandler.balance_command))
     application.add_handler(CommandHandler("transfer", BotHandler.transfer_command))
     application.add_handler(CommandHandler("history", BotHandler.history_command))
+    application.add_handler(CommandHandler("stats", BotHandler.stats_command))
+    application.add_handler(CommandHandler("top", BotHandler.top_command))
+    application.add_handler(CommandHandler("rank", BotHandler.rank_command))
     application.add_handler(CommandHandler("attendance", BotHandler.attendance_command))
     application.add_handler(CommandHandler("help", BotHandler.help_command))
+    application.add_handler(CommandHandler("odds", BotHandler.odds_command))
     
     # 배팅 명령어 핸들러
     application.add_handler(CommandHandler("player", BotHandler.player_bet_command))
@@ -332,6 +488,26 @@ def main():
     application.add_handler(CallbackQueryHandler(BotHandler.button_callback))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, BotHandler.message_handler))
     
+    return application
+
+def main():
+    """메인 함수"""
+    if SHARD_WORKERS:
+        # 채팅별 워커 프로세스 + 원장 프로세스로 실행 (sharding.py)
+        from sharding import run_sharded
+        print(f"🎰 바카라 게임 봇이 워커 {SHARD_WORKERS}개로 시작되었습니다!")
+        run_sharded(SHARD_WORKERS)
+        return
+    
+    application = build_application()
+    
+    if METRICS_ENABLED:
+        start_metrics_server()
+        print(f"📈 메트릭: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    
+    if install_signal_handlers():
+        print(f"🔍 프로파일링: kill -USR1 {os.getpid()} 으로 켜기/끄기")
+    
     # 봇 시작
     print("🎰 바카라 게임 봇이 시작되었습니다!")
     print("📋 새로운 기능:")
@@ -339,8 +515,37 @@ def main():
     print("   - /player [금액] - 플레이어 배팅") 
     print("   - /tie [금액] - 무승부 배팅")
     print("   - /attendance - 출석 체크")
+    print("   - /odds - 현재 슈 확률/기대값")
     print("   - 60초 타이머 멀티플레이어 게임")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    run_application(application)
+
+def webhook_available():
+    """웹훅 모드로 실행할 수 있는지 (설정 + python-telegram-bot[webhooks])"""
+    if not WEBHOOK_URL:
+        print("⚠️ WEBHOOK_URL이 설정되지 않아 polling으로 실행합니다.")
+        return False
+    if importlib.util.find_spec("tornado") is None:
+        print("⚠️ python-telegram-bot[webhooks]가 설치되지 않아 polling으로 실행합니다.")
+        return False
+    return True
+
+def run_application(application):
+    """UPDATE_MODE에 따라 웹훅 또는 polling으로 실행"""
+    if UPDATE_MODE == "webhook" and webhook_available():
+        # 텔레그램이 보낸 요청인지 헤더의 비밀 토큰으로 확인 (다르면 403)
+        secret_token = WEBHOOK_SECRET_TOKEN or secrets.token_urlsafe(32)
+        print(f"🌐 웹훅 모드: {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=secret_token,
+            allowed_updates=ALLOWED_UPDATES,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
@@ -3,14 +3,72 @@
 # 텔레그램 봇 토큰
 BOT_TOKEN = "8446673548:AAG3Ra2j8TE7K-G3VGyX8FM6qEcG2rnS3Q8"
 
+# 업데이트 수신 방식: "polling" 또는 "webhook" (웹훅 설정이 없으면 polling으로 동작)
+UPDATE_MODE = "polling"
+WEBHOOK_URL = ""                # 텔레그램이 접속할 외부 HTTPS 주소 (예: https://bot.example.com)
+WEBHOOK_LISTEN = "0.0.0.0"      # 로컬 웹훅 서버 주소
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = "telegram"       # 웹훅 URL 경로
+WEBHOOK_SECRET_TOKEN = ""       # X-Telegram-Bot-Api-Secret-Token (비우면 시작할 때마다 생성)
+WEBHOOK_MAX_CONNECTIONS = 40    # 텔레그램이 동시에 여는 웹훅 연결 수
+UPDATE_QUEUE_SIZE = 1000        # 처리 대기 업데이트 수 (가득 차면 수신을 늦춤)
+CONCURRENT_UPDATES = 256        # 동시에 처리할 업데이트 수 (0이면 순서대로 하나씩)
+SHARD_WORKERS = 0               # 채팅을 나눠 처리할 워커 프로세스 수 (0이면 단일 프로세스)
+SHARD_SHUTDOWN_TIMEOUT = 30     # 종료 시 워커/원장 프로세스를 기다릴 최대 시간 (초, 넘으면 강제 종료)
+
 # 데이터베이스 설정
 DATABASE_PATH = "baccarat_bot.db"
+DB_CACHE_SIZE_KB = 16384        # SQLite 페이지 캐시 크기 (KB, 연결당)
+DB_BUSY_TIMEOUT_MS = 5000       # 잠금 대기 시간 (밀리초)
+DB_STATEMENT_CACHE_SIZE = 128   # 연결당 준비된 구문 캐시 개수
+
+# 잔액 원장 설정 (메모리 잔액을 저널에 기록 후 주기적으로 DB 반영)
+LEDGER_JOURNAL_PATH = "baccarat_bot.ledger"
+LEDGER_FLUSH_INTERVAL = 2.0     # DB 반영 주기 (초)
+LEDGER_FLUSH_THRESHOLD = 500    # 반영 대기 사용자 수가 이 값을 넘으면 즉시 반영
+
+# 게임 세션 저널 설정 (재시작/장애 후 진행 중인 라운드 복구)
+SESSION_JOURNAL_PATH = "baccarat_bot.sessions"
+SESSION_JOURNAL_COMPACT_LINES = 10000  # 저널이 이 줄 수를 넘으면 열린 세션만 남기고 압축
+SESSION_REFUND_AFTER = 600             # 마감 후 이 시간(초)이 지난 세션은 정산하지 않고 배팅금 반환
 
 # 게임 설정
 INITIAL_BALANCE = 10000  # 초기 잔액
 MIN_BET = 100           # 최소 베팅 금액
 MAX_BET = 50000         # 최대 베팅 금액
 GAME_TIMER = 60         # 게임 타이머 (초)
+BET_STATUS_TOP_N = 30   # 배팅 현황에 표시할 최대 인원 (나머지는 "외 N명")
+SHOE_DECKS = 8          # 채팅별 슈에 들어가는 덱 수
+SHOE_PENETRATION = 0.8  # 컷 카드 위치 (슈 전체 대비 비율)
+ODDS_CACHE_SIZE = 1024  # 슈 구성별 정확한 확률 계산 결과 캐시 개수
+ODDS_WORKERS = 1        # /odds 계산 전용 프로세스 수 (GIL과 무관하게 이벤트 루프를 막지 않도록)
+
+# 게임 기록 설정 (/history 페이지)
+HISTORY_PAGE_SIZE = 5           # 한 페이지에 보여줄 기록 수
+HISTORY_CACHE_USERS = 1000      # 렌더링한 페이지를 캐시할 사용자 수 (LRU)
+HISTORY_CACHE_PAGES = 20        # 사용자당 캐시할 페이지 수
+
+# 순위표 설정 (/top, /rank)
+LEADERBOARD_TOP_N = 10          # /top에 보여줄 순위 수
+
+# 발신 메시지 설정 (Telegram flood 제한)
+OUTBOUND_GLOBAL_RATE = 25       # 전체 초당 전송 수
+OUTBOUND_CHAT_RATE = 0.33       # 채팅별 초당 전송 수 (그룹 분당 20건 제한)
+OUTBOUND_CHAT_BURST = 3         # 채팅별 연속 전송 허용 수
+OUTBOUND_CONCURRENCY = 8        # 동시에 진행할 Bot API 호출 수
+OUTBOUND_MAX_RETRIES = 3        # 전송 실패 시 최대 시도 횟수
+OUTBOUND_RETRY_BACKOFF = 0.5    # 네트워크 오류 후 재전송까지 기본 대기 (초, 시도마다 2배)
+OUTBOUND_DRAIN_TIMEOUT = 10     # 종료 시 대기 중인 메시지를 보내며 기다릴 최대 시간 (초)
+
+# 메트릭 설정 (Prometheus /metrics 엔드포인트)
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# 프로파일링 설정 (실행 중 SIGUSR1로 켜기/끄기)
+PROFILING_SAMPLING = True                   # 켤 때 cProfile도 함께 기록
+PROFILE_REPORT_PATH = "profile_report.txt"  # 리포트 저장 경로
+SLOW_QUERY_MS = 100                         # 느린 쿼리 로그 기준 (ms, 0이면 끔)
 
 # 출석 설정
 DAILY_ATTENDANCE_REWARD = 5000  # 일일 출석 보상
@@ -36,7 +94,11 @@ MESSAGES = {
 /balance - 잔액 확인
 /transfer - 다른 사용자에게 송금
 /history - 게임 기록 확인
+/stats - 배팅 종류별 게임 통계
+/top - 잔액 순위 (/top 수익: 순이익, /top 전체: 그룹에서 전체 순위)
+/rank - 내 순위
 /attendance - 출석 체크
+/odds - 현재 슈 기준 확률/기대값
 /help - 도움말
 
 🎮 배팅 명령어:
@@ -70,6 +132,7 @@ MESSAGES = {
     'bet_updated': '🔄 배팅 업데이트!\n🎯 {bet_type}: {amount}원\n💰 잔액: {balance}원',
     'game_countdown': '⏰ 남은 시간: {time}초\n💰 현재 배팅 현황:\n{bet_status}',
     'no_bets': '❌ 배팅이 없어 게임이 취소되었습니다.',
+    'session_refunded': '♻️ 봇 재시작으로 중단된 게임이 취소되어 배팅금 {amount:,}원({count}명)이 반환되었습니다.',
     'multi_game_result': '''🎲 게임 결과:
 
 👤 플레이어: {player_cards} (총합: {player_total})
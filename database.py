@@ -1,271 +1,477 @@
 import sqlite3
 import datetime
-from config import DATABASE_PATH, INITIAL_BALANCE
+import time
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import (DATABASE_PATH, INITIAL_BALANCE, DB_CACHE_SIZE_KB,
+                    DB_BUSY_TIMEOUT_MS, DB_STATEMENT_CACHE_SIZE)
+from metrics import DB_QUERY_LATENCY
+from profiling import PROFILER, ProfiledConnection, log_slow_query
+
+# 배팅 종류별 누적 통계 갱신 (정산과 같은 트랜잭션에서 실행)
+UPSERT_USER_STATS = '''
+    INSERT INTO user_stats (user_id, bet_type, rounds, wagered, payout, wins)
+    VALUES (?, ?, 1, ?, ?, ?)
+    ON CONFLICT (user_id, bet_type) DO UPDATE SET
+        rounds = rounds + 1,
+        wagered = wagered + excluded.wagered,
+        payout = payout + excluded.payout,
+        wins = wins + excluded.wins
+'''
+
+# game_history를 한 번 훑어 user_stats 재계산
+REBUILD_USER_STATS = '''
+    INSERT INTO user_stats (user_id, bet_type, rounds, wagered, payout, wins)
+    SELECT user_id, bet_type, COUNT(*), SUM(bet_amount), SUM(payout), SUM(payout > 0)
+    FROM game_history
+    GROUP BY user_id, bet_type
+'''
+
+# 스키마 마이그레이션 (PRAGMA user_version으로 적용 버전 추적)
+# 새 변경은 항상 목록 끝에 다음 버전으로 추가합니다.
+SCHEMA_MIGRATIONS = [
+    # 1: 기본 테이블
+    (1, [
+        # 사용자 테이블
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            balance INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # 게임 기록 테이블
+        '''
+        CREATE TABLE IF NOT EXISTS game_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            bet_amount INTEGER,
+            bet_type TEXT,
+            player_cards TEXT,
+            banker_cards TEXT,
+            player_total INTEGER,
+            banker_total INTEGER,
+            winner TEXT,
+            payout INTEGER,
+            balance_before INTEGER,
+            balance_after INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        # 송금 기록 테이블
+        '''
+        CREATE TABLE IF NOT EXISTS transfers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_id INTEGER,
+            recipient_id INTEGER,
+            amount INTEGER,
+            sender_balance_before INTEGER,
+            sender_balance_after INTEGER,
+            recipient_balance_before INTEGER,
+            recipient_balance_after INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (sender_id) REFERENCES users (user_id),
+            FOREIGN KEY (recipient_id) REFERENCES users (user_id)
+        )
+        ''',
+        # 출석 기록 테이블
+        '''
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            attendance_date DATE,
+            reward_amount INTEGER,
+            consecutive_days INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            UNIQUE(user_id, attendance_date)
+        )
+        '''
+    ]),
+    # 2: 주요 조회용 인덱스
+    #   attendance 조회는 UNIQUE(user_id, attendance_date) 자동 인덱스가 처리
+    (2, [
+        'CREATE INDEX IF NOT EXISTS idx_game_history_user_id ON game_history (user_id, id)',
+        'CREATE INDEX IF NOT EXISTS idx_users_username ON users (username COLLATE NOCASE)',
+        'CREATE INDEX IF NOT EXISTS idx_transfers_sender_id ON transfers (sender_id)',
+        'CREATE INDEX IF NOT EXISTS idx_transfers_recipient_id ON transfers (recipient_id)',
+    ]),
+    # 3: 사용자별 배팅 종류별 누적 통계 (/stats), 기존 기록으로 채움
+    (3, [
+        '''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER,
+            bet_type TEXT,
+            rounds INTEGER NOT NULL DEFAULT 0,
+            wagered INTEGER NOT NULL DEFAULT 0,
+            payout INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, bet_type)
+        ) WITHOUT ROWID
+        ''',
+        REBUILD_USER_STATS,
+    ]),
+    # 4: 채팅별 사용자 순이익 (/top, /rank 채팅 순위), 기존 기록에는 채팅 정보가 없어 비어 있는 상태로 시작
+    (4, [
+        '''
+        CREATE TABLE IF NOT EXISTS chat_stats (
+            chat_id INTEGER,
+            user_id INTEGER,
+            rounds INTEGER NOT NULL DEFAULT 0,
+            net INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (chat_id, user_id)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+]
+
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
 
 class Database:
-    def __init__(self):
-        self.db_path = DATABASE_PATH
+    def __init__(self, db_path=None):
+        self.db_path = db_path or DATABASE_PATH
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self.init_database()
     
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """현재 스레드의 영구 연결 반환 (최초 호출 시 생성)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                cached_statements=DB_STATEMENT_CACHE_SIZE,
+                check_same_thread=False,
+                factory=ProfiledConnection
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA cache_size=-{int(DB_CACHE_SIZE_KB)}')
+            conn.execute(f'PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def close(self):
+        """열린 모든 연결 종료"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+    
+    @staticmethod
+    def _user_from_row(user):
+        """users 행을 사전으로 변환"""
+        if user:
+            return {
+                'user_id': user[0],
+                'username': user[1],
+                'first_name': user[2],
+                'last_name': user[3],
+                'balance': user[4],
+                'created_at': user[5],
+                'last_active': user[6]
+            }
+        return None
     
     def init_database(self):
-        """데이터베이스 테이블 초기화"""
+        """데이터베이스 스키마를 최신 버전으로 마이그레이션"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # 사용자 테이블
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                balance INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 게임 기록 테이블
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS game_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                bet_amount INTEGER,
-                bet_type TEXT,
-                player_cards TEXT,
-                banker_cards TEXT,
-                player_total INTEGER,
-                banker_total INTEGER,
-                winner TEXT,
-                payout INTEGER,
-                balance_before INTEGER,
-                balance_after INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
-        
-        # 송금 기록 테이블
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transfers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sender_id INTEGER,
-                recipient_id INTEGER,
-                amount INTEGER,
-                sender_balance_before INTEGER,
-                sender_balance_after INTEGER,
-                recipient_balance_before INTEGER,
-                recipient_balance_after INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (sender_id) REFERENCES users (user_id),
-                FOREIGN KEY (recipient_id) REFERENCES users (user_id)
-            )
-        ''')
         
-        # 출석 기록 테이블
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS attendance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                attendance_date DATE,
-                reward_amount INTEGER,
-                consecutive_days INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id),
-                UNIQUE(user_id, attendance_date)
-            )
-        ''')
+        current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if current_version >= SCHEMA_VERSION:
+            return
         
-        conn.commit()
-        conn.close()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 다른 프로세스가 먼저 마이그레이션했을 수 있으므로 잠금 후 다시 확인
+            current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for version, statements in SCHEMA_MIGRATIONS:
+                if version <= current_version:
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
     
     def create_user(self, user_id, username=None, first_name=None, last_name=None):
         """새 사용자 생성"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                INSERT OR IGNORE INTO users (user_id, username, first_name, last_name, balance)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, username, first_name, last_name, INITIAL_BALANCE))
-            
-            conn.commit()
+            with conn:
+                conn.execute('''
+                    INSERT OR IGNORE INTO users (user_id, username, first_name, last_name, balance)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, username, first_name, last_name, INITIAL_BALANCE))
             return True
         except Exception as e:
             print(f"사용자 생성 오류: {e}")
             return False
-        finally:
-            conn.close()
     
     def get_user(self, user_id):
         """사용자 정보 조회"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-        user = cursor.fetchone()
-        conn.close()
-        
-        if user:
-            return {
-                'user_id': user[0],
-                'username': user[1],
-                'first_name': user[2],
-                'last_name': user[3],
-                'balance': user[4],
-                'created_at': user[5],
-                'last_active': user[6]
-            }
-        return None
+        user = conn.execute('SELECT * FROM users WHERE user_id = ?', (user_id,)).fetchone()
+        return self._user_from_row(user)
     
     def update_balance(self, user_id, new_balance):
         """사용자 잔액 업데이트"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                UPDATE users SET balance = ?, last_active = CURRENT_TIMESTAMP
-                WHERE user_id = ?
-            ''', (new_balance, user_id))
-            
-            conn.commit()
+            with conn:
+                conn.execute('''
+                    UPDATE users SET balance = ?, last_active = CURRENT_TIMESTAMP
+                    WHERE user_id = ?
+                ''', (new_balance, user_id))
             return True
         except Exception as e:
             print(f"잔액 업데이트 오류: {e}")
             return False
+    
+    def set_balances(self, balances):
+        """여러 사용자 잔액을 한 트랜잭션으로 설정
+        
+        잔액 원장은 이 커밋 뒤 저널을 비우므로 이 트랜잭션만 synchronous=FULL로 커밋합니다
+        (NORMAL이면 WAL이 체크포인트 전까지 fsync되지 않음).
+        
+        Args:
+            balances: [(user_id, balance), ...]
+        """
+        conn = self.get_connection()
+        
+        conn.execute('PRAGMA synchronous=FULL')
+        try:
+            with conn:
+                conn.executemany('''
+                    UPDATE users SET balance = ?, last_active = CURRENT_TIMESTAMP
+                    WHERE user_id = ?
+                ''', [(balance, user_id) for user_id, balance in balances])
         finally:
-            conn.close()
+            conn.execute('PRAGMA synchronous=NORMAL')
+        return True
     
     def add_game_record(self, user_id, bet_amount, bet_type, player_cards, banker_cards,
                        player_total, banker_total, winner, payout, balance_before, balance_after):
         """게임 기록 추가"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         try:
-            cursor.execute('''
+            with conn:
+                conn.execute('''
+                    INSERT INTO game_history 
+                    (user_id, bet_amount, bet_type, player_cards, banker_cards, 
+                     player_total, banker_total, winner, payout, balance_before, balance_after)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (user_id, bet_amount, bet_type, player_cards, banker_cards,
+                      player_total, banker_total, winner, payout, balance_before, balance_after))
+                conn.execute(UPSERT_USER_STATS, (user_id, bet_type, bet_amount, payout, int(payout > 0)))
+            return True
+        except Exception as e:
+            print(f"게임 기록 추가 오류: {e}")
+            return False
+    
+    def settle_round(self, settlements, player_cards, banker_cards,
+                     player_total, banker_total, winner, chat_id=None):
+        """라운드 전체 정산 결과를 한 트랜잭션으로 저장
+        
+        Args:
+            settlements: [(user_id, bet_amount, bet_type, payout, balance_after), ...]
+            chat_id: 라운드가 진행된 채팅 (있으면 chat_stats도 갱신)
+        """
+        conn = self.get_connection()
+        
+        with conn:
+            # 잔액은 BalanceLedger.flush만 기록 (여기서 쓰면 정산 이후의 변경을 덮어쓸 수 있음)
+            conn.executemany('''
+                UPDATE users SET last_active = CURRENT_TIMESTAMP WHERE user_id = ?
+            ''', [(user_id,) for user_id, _, _, _, _ in settlements])
+            
+            # 게임 기록 일괄 추가 (배팅 전 잔액 기준)
+            conn.executemany('''
                 INSERT INTO game_history 
                 (user_id, bet_amount, bet_type, player_cards, banker_cards, 
                  player_total, banker_total, winner, payout, balance_before, balance_after)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, bet_amount, bet_type, player_cards, banker_cards,
-                  player_total, banker_total, winner, payout, balance_before, balance_after))
+            ''', [
+                (user_id, bet_amount, bet_type, player_cards, banker_cards,
+                 player_total, banker_total, winner, payout,
+                 balance_after - payout + bet_amount, balance_after)
+                for user_id, bet_amount, bet_type, payout, balance_after in settlements
+            ])
             
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"게임 기록 추가 오류: {e}")
-            return False
-        finally:
-            conn.close()
+            # 누적 통계 갱신
+            conn.executemany(UPSERT_USER_STATS, [
+                (user_id, bet_type, bet_amount, payout, int(payout > 0))
+                for user_id, bet_amount, bet_type, payout, _ in settlements
+            ])
+            
+            if chat_id is not None:
+                conn.executemany('''
+                    INSERT INTO chat_stats (chat_id, user_id, rounds, net) VALUES (?, ?, 1, ?)
+                    ON CONFLICT (chat_id, user_id) DO UPDATE SET
+                        rounds = rounds + 1,
+                        net = net + excluded.net
+                ''', [
+                    (chat_id, user_id, payout - bet_amount)
+                    for user_id, bet_amount, _, payout, _ in settlements
+                ])
+        return True
     
     def get_game_history(self, user_id, limit=10):
         """사용자 게임 기록 조회"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
-        cursor.execute('''
+        return conn.execute('''
             SELECT * FROM game_history 
             WHERE user_id = ? 
-            ORDER BY created_at DESC 
+            ORDER BY id DESC 
             LIMIT ?
-        ''', (user_id, limit))
+        ''', (user_id, limit)).fetchall()
+    
+    def get_user_stats(self, user_id):
+        """사용자 배팅 종류별 누적 통계 (기본 키 조회)"""
+        conn = self.get_connection()
         
-        records = cursor.fetchall()
-        conn.close()
+        return conn.execute('''
+            SELECT bet_type, rounds, wagered, payout, wins FROM user_stats 
+            WHERE user_id = ?
+        ''', (user_id,)).fetchall()
+    
+    def get_ranking_snapshot(self):
+        """순위표 재구성용 (잔액, 사용자별 순이익, 채팅별 순이익)"""
+        conn = self.get_connection()
+        
+        balances = conn.execute('SELECT user_id, balance FROM users').fetchall()
+        profits = conn.execute('''
+            SELECT user_id, SUM(payout) - SUM(wagered) FROM user_stats 
+            GROUP BY user_id
+        ''').fetchall()
+        chat_profits = conn.execute('SELECT chat_id, user_id, net FROM chat_stats').fetchall()
+        return balances, profits, chat_profits
+    
+    def get_display_names(self, user_ids):
+        """{user_id: username 또는 이름}"""
+        conn = self.get_connection()
         
-        return records
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        placeholders = ",".join("?" * len(user_ids))
+        rows = conn.execute(
+            f'SELECT user_id, username, first_name FROM users WHERE user_id IN ({placeholders})', user_ids
+        ).fetchall()
+        return {user_id: username or first_name or str(user_id) for user_id, username, first_name in rows}
+    
+    def rebuild_user_stats(self):
+        """user_stats를 game_history로부터 다시 계산, (사용자, 배팅 종류) 행 수 반환"""
+        conn = self.get_connection()
+        
+        with conn:
+            conn.execute('DELETE FROM user_stats')
+            conn.execute(REBUILD_USER_STATS)
+        return conn.execute('SELECT COUNT(*) FROM user_stats').fetchone()[0]
+    
+    def get_game_history_page(self, user_id, limit, before_id=None, after_id=None):
+        """게임 기록 키셋 페이지 조회 (OFFSET 없이 (user_id, id) 인덱스에서 바로 시작)
+        
+        before_id가 있으면 그보다 오래된 기록, after_id가 있으면 그보다 새로운 기록,
+        둘 다 없으면 최신 기록부터 limit개를 id 내림차순으로 반환합니다.
+        """
+        conn = self.get_connection()
+        
+        if after_id is not None:
+            rows = conn.execute('''
+                SELECT * FROM game_history 
+                WHERE user_id = ? AND id > ? 
+                ORDER BY id ASC 
+                LIMIT ?
+            ''', (user_id, after_id, limit)).fetchall()
+            rows.reverse()
+            return rows
+        
+        if before_id is not None:
+            return conn.execute('''
+                SELECT * FROM game_history 
+                WHERE user_id = ? AND id < ? 
+                ORDER BY id DESC 
+                LIMIT ?
+            ''', (user_id, before_id, limit)).fetchall()
+        
+        return self.get_game_history(user_id, limit)
     
     def add_transfer_record(self, sender_id, recipient_id, amount, 
                            sender_balance_before, sender_balance_after,
                            recipient_balance_before, recipient_balance_after):
         """송금 기록 추가"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                INSERT INTO transfers 
-                (sender_id, recipient_id, amount, sender_balance_before, sender_balance_after,
-                 recipient_balance_before, recipient_balance_after)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (sender_id, recipient_id, amount, sender_balance_before, sender_balance_after,
-                  recipient_balance_before, recipient_balance_after))
-            
-            conn.commit()
+            with conn:
+                conn.execute('''
+                    INSERT INTO transfers 
+                    (sender_id, recipient_id, amount, sender_balance_before, sender_balance_after,
+                     recipient_balance_before, recipient_balance_after)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (sender_id, recipient_id, amount, sender_balance_before, sender_balance_after,
+                      recipient_balance_before, recipient_balance_after))
             return True
         except Exception as e:
             print(f"송금 기록 추가 오류: {e}")
             return False
-        finally:
-            conn.close()
     
     def get_user_by_username(self, username):
         """사용자명으로 사용자 조회"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
-        user = cursor.fetchone()
-        conn.close()
-        
-        if user:
-            return {
-                'user_id': user[0],
-                'username': user[1],
-                'first_name': user[2],
-                'last_name': user[3],
-                'balance': user[4],
-                'created_at': user[5],
-                'last_active': user[6]
-            }
-        return None
+        user = conn.execute(
+            'SELECT * FROM users WHERE username = ? COLLATE NOCASE', (username,)
+        ).fetchone()
+        return self._user_from_row(user)
     
     def check_attendance_today(self, user_id):
         """오늘 출석 체크 여부 확인"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM attendance 
+        result = conn.execute('''
+            SELECT 1 FROM attendance 
             WHERE user_id = ? AND attendance_date = DATE('now')
-        ''', (user_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
+        ''', (user_id,)).fetchone()
         
         return result is not None
     
     def get_consecutive_attendance(self, user_id):
         """연속 출석 일수 조회"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
-        cursor.execute('''
+        result = conn.execute('''
             SELECT consecutive_days FROM attendance 
             WHERE user_id = ? 
             ORDER BY attendance_date DESC 
             LIMIT 1
-        ''', (user_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
+        ''', (user_id,)).fetchone()
         
         if result:
             # 어제 출석했는지 확인
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM attendance 
+            yesterday_attendance = conn.execute('''
+                SELECT 1 FROM attendance 
                 WHERE user_id = ? AND attendance_date = DATE('now', '-1 day')
-            ''', (user_id,))
-            
-            yesterday_attendance = cursor.fetchone()
-            conn.close()
+            ''', (user_id,)).fetchone()
             
             if yesterday_attendance:
                 return result[0]  # 연속 출석 유지
@@ -277,19 +483,69 @@ class Database:
     def add_attendance_record(self, user_id, reward_amount, consecutive_days):
         """출석 기록 추가"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                INSERT INTO attendance (user_id, attendance_date, reward_amount, consecutive_days)
-                VALUES (?, DATE('now'), ?, ?)
-            ''', (user_id, reward_amount, consecutive_days))
-            
-            conn.commit()
+            with conn:
+                conn.execute('''
+                    INSERT INTO attendance (user_id, attendance_date, reward_amount, consecutive_days)
+                    VALUES (?, DATE('now'), ?, ?)
+                ''', (user_id, reward_amount, consecutive_days))
             return True
         except Exception as e:
             print(f"출석 기록 추가 오류: {e}")
             return False
-        finally:
-            conn.close()
 
+class AsyncDatabase:
+    """Database 메서드를 전용 DB 스레드에서 실행하는 비동기 래퍼
+
+    모든 쿼리는 단일 워커 스레드에서 순서대로 실행되므로 이벤트 루프는
+    SQLite의 connect/commit 동안에도 다른 채팅의 업데이트와 타이머를 계속 처리합니다.
+    """
+    
+    def __init__(self, database=None):
+        self.sync = database or Database()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+    
+    async def run(self, func, *args, **kwargs):
+        """임의의 동기 함수를 DB 스레드에서 실행"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self._timed, func, args, kwargs))
+    
+    def _timed(self, func, args, kwargs):
+        """DB 스레드에서 실행: 메서드 이름별 실행 시간 기록, 느린 쿼리 로그"""
+        name = getattr(func, '__name__', 'query')
+        slow_seconds = PROFILER.slow_query_seconds
+        conn = None
+        if slow_seconds:
+            conn = self.sync.get_connection()
+            conn.statements = []
+        
+        started = time.perf_counter()
+        try:
+            return PROFILER.run_db_call(func, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            DB_QUERY_LATENCY.observe(elapsed, name)
+            if PROFILER.enabled:
+                PROFILER.record(f"Database.{name}", elapsed)
+            if conn is not None:
+                statements, conn.statements = conn.statements, None
+                if elapsed >= slow_seconds and statements:
+                    log_slow_query(conn, name, elapsed, statements)
+    
+    def __getattr__(self, name):
+        method = getattr(self.sync, name)
+        if not callable(method):
+            return method
+        
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+        
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+    
+    def close(self):
+        """DB 스레드와 연결 종료"""
+        self._executor.shutdown(wait=True)
+        self.sync.close()
@@ -0,0 +1,217 @@
+"""
+로컬 테스트용 Telegram Bot API 대역 서버
+
+실제 봇(Application)을 base_url만 바꿔 이 서버에 연결하면 getUpdates 롱 폴링으로
+push_message로 넣은 업데이트를 받아 가고, sendMessage/editMessageText 등의 호출은
+메모리에 기록됩니다. 부하 테스트(load_test.py)에서 같은 이벤트 루프 안에서 사용합니다.
+
+지원 메서드: getMe, getUpdates, sendMessage, editMessageText, answerCallbackQuery
+(그 외 메서드는 True를 반환)
+"""
+
+import json
+import time
+import asyncio
+import itertools
+from collections import Counter
+from urllib.parse import parse_qs, unquote
+
+class FakeBotAPI:
+    """asyncio 기반 최소 HTTP/1.1 Bot API 서버"""
+    
+    def __init__(self, host='127.0.0.1', port=0, bot_id=1000000, bot_username='baccarat_test_bot'):
+        self.host = host
+        self.port = port
+        self.bot_user = {'id': bot_id, 'is_bot': True, 'first_name': 'Baccarat', 'username': bot_username}
+        self.updates = []          # 아직 확인(offset)되지 않은 Update
+        self.calls = Counter()     # 메서드별 호출 수
+        self.listeners = []        # listener(method, params, result) - 발신 메서드 호출 시
+        self._update_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+        self._message_ids = {}     # {chat_id: 마지막 message_id}
+        self._new_update = None
+        self._server = None
+        self._methods = {
+            'getme': self.get_me,
+            'getupdates': self.get_updates,
+            'sendmessage': self.send_message,
+            'editmessagetext': self.edit_message_text,
+            'answercallbackquery': self.answer_callback_query,
+        }
+    
+    @property
+    def base_url(self):
+        """Application.builder().base_url()에 넘길 주소"""
+        return f"http://{self.host}:{self.port}/bot"
+    
+    async def start(self):
+        self._new_update = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+    
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+    
+    # ------------------------------------------------------------ 업데이트 생성
+    
+    def _next_message_id(self, chat_id):
+        message_id = self._message_ids.get(chat_id, 0) + 1
+        self._message_ids[chat_id] = message_id
+        return message_id
+    
+    @staticmethod
+    def _chat(chat_id):
+        if chat_id > 0:
+            return {'id': chat_id, 'type': 'private', 'first_name': f"user{chat_id}"}
+        return {'id': chat_id, 'type': 'group', 'title': f"chat{-chat_id}"}
+    
+    def _push_update(self, **payload):
+        payload['update_id'] = next(self._update_ids)
+        self.updates.append(payload)
+        self._new_update.set()
+        return payload['update_id']
+    
+    def push_message(self, chat_id, user, text):
+        """사용자 메시지 업데이트 추가, message_id 반환
+        
+        Args:
+            chat_id: 채팅 ID (음수면 그룹)
+            user: {'id', 'first_name', 'username'} 사전
+            text: 메시지 ('/'로 시작하면 명령어 엔티티 포함)
+        """
+        message_id = self._next_message_id(chat_id)
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': self._chat(chat_id),
+            'from': dict(user, is_bot=False),
+            'text': text
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        self._push_update(message=message)
+        return message_id
+    
+    def push_callback_query(self, chat_id, user, message_id, data):
+        """인라인 버튼 클릭 업데이트 추가, callback query ID 반환"""
+        query_id = str(next(self._callback_ids))
+        self._push_update(callback_query={
+            'id': query_id,
+            'from': dict(user, is_bot=False),
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': self._chat(chat_id),
+                'from': self.bot_user,
+                'text': ''
+            }
+        })
+        return query_id
+    
+    # ------------------------------------------------------------ Bot API 메서드
+    
+    async def get_me(self, params):
+        return self.bot_user
+    
+    async def get_updates(self, params):
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 100))
+        timeout = float(params.get('timeout', 0))
+        
+        # offset 이전 업데이트는 확인된 것으로 보고 제거
+        if offset:
+            self.updates = [update for update in self.updates if update['update_id'] >= offset]
+        
+        if not self.updates and timeout > 0:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:limit]
+    
+    def _bot_message(self, chat_id, text, message_id=None):
+        return {
+            'message_id': message_id or self._next_message_id(chat_id),
+            'date': int(time.time()),
+            'chat': self._chat(chat_id),
+            'from': self.bot_user,
+            'text': text
+        }
+    
+    async def send_message(self, params):
+        return self._bot_message(int(params['chat_id']), params.get('text', ''))
+    
+    async def edit_message_text(self, params):
+        return self._bot_message(int(params['chat_id']), params.get('text', ''), int(params['message_id']))
+    
+    async def answer_callback_query(self, params):
+        return True
+    
+    # ------------------------------------------------------------ HTTP 처리
+    
+    async def _call(self, method, params):
+        self.calls[method] += 1
+        handler = self._methods.get(method.lower())
+        result = await handler(params) if handler else True
+        if method.lower() in ('sendmessage', 'editmessagetext'):
+            for listener in self.listeners:
+                listener(method, params, result)
+        return result
+    
+    @staticmethod
+    def _parse_params(content_type, body):
+        """form/JSON 본문을 {이름: 값} 사전으로 (문자열이 아닌 값은 JSON 문자열)"""
+        if not body:
+            return {}
+        if content_type.startswith('application/json'):
+            return {key: value if isinstance(value, str) else json.dumps(value)
+                    for key, value in json.loads(body).items()}
+        return {key: values[0] for key, values in parse_qs(body.decode('utf-8'), keep_blank_values=True).items()}
+    
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode('latin-1').split(' ', 2)
+                
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                params = self._parse_params(headers.get('content-type', ''), body)
+                
+                # /bot<token>/<method>
+                method = unquote(path.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1])
+                try:
+                    response = {'ok': True, 'result': await self._call(method, params)}
+                except Exception as e:
+                    response = {'ok': False, 'error_code': 400, 'description': f"Bad Request: {e}"}
+                
+                payload = json.dumps(response, ensure_ascii=False).encode('utf-8')
+                status = b'200 OK' if response['ok'] else b'400 Bad Request'
+                writer.write(
+                    b'HTTP/1.1 ' + status + b'\r\nContent-Type: application/json\r\n'
+                    b'Content-Length: ' + str(len(payload)).encode() + b'\r\n\r\n' + payload
+                )
+                await writer.drain()
+                
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # 종료 시 진행 중인 롱 폴링 취소 포함
+            pass
+        finally:
+            writer.close()
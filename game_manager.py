@@ -1,32 +1,59 @@
 import asyncio
+import bisect
 import time
 from typing import Dict, List
-from baccarat_game import BaccaratGame
+from baccarat_game import BaccaratGame, Shoe
 from user_service import UserService
-from config import GAME_TIMER, MESSAGES
+from timer_scheduler import TimerScheduler
+from keyed_locks import KeyedLocks
+from session_journal import SessionJournal
+from message_dispatcher import MessageDispatcher, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from metrics import ACTIVE_SESSIONS, ROUND_BETTORS, SETTLEMENT_LATENCY
+from profiling import profiled
+from config import GAME_TIMER, MESSAGES, BET_STATUS_TOP_N, SESSION_REFUND_AFTER
+
+# 카운트다운 메시지를 보낼 남은 시간 (초)
+COUNTDOWN_TIMES = (30, 10, 5)
 
 class GameSession:
     """게임 세션 클래스"""
-    def __init__(self, chat_id):
+    def __init__(self, chat_id, duration=GAME_TIMER):
         self.chat_id = chat_id
+        self.duration = duration  # 배팅 시간 (초)
         self.bets = {}  # {user_id: {'type': str, 'amount': int, 'username': str}}
         self.start_time = time.time()
         self.is_active = True
-        self.timer_task = None
+        self.timers = []  # 스케줄러에 등록된 마감/카운트다운 타이머
         self.message_id = None
         
+        # 배팅 현황 렌더링 캐시 (add_bet에서 갱신)
+        self.totals = {'플레이어': 0, '뱅커': 0, '무승부': 0}
+        self._bet_lines = {}  # {user_id: 렌더링된 배팅 줄}
+        self._ranked = []     # 금액 큰 순 [(-금액, user_id)] (바뀐 배팅만 bisect로 갱신)
+        self._status_text = None
+        
     def add_bet(self, user_id, username, bet_type, amount):
         """배팅 추가/업데이트"""
+        previous = self.bets.get(user_id)
+        if previous:
+            self.totals[previous['type']] -= previous['amount']
+            del self._ranked[bisect.bisect_left(self._ranked, (-previous['amount'], user_id))]
+        
+        username = username or f"User{user_id}"
         self.bets[user_id] = {
             'type': bet_type,
             'amount': amount,
-            'username': username or f"User{user_id}"
+            'username': username
         }
+        self.totals[bet_type] += amount
+        bisect.insort(self._ranked, (-amount, user_id))
+        self._bet_lines[user_id] = f"👤 {username}: {bet_type} {amount:,}원"
+        self._status_text = None
     
     def get_remaining_time(self):
         """남은 시간 계산"""
         elapsed = time.time() - self.start_time
-        remaining = max(0, GAME_TIMER - elapsed)
+        remaining = max(0, self.duration - elapsed)
         return int(remaining)
     
     def is_expired(self):
@@ -34,24 +61,25 @@ class GameSession:
         return self.get_remaining_time() <= 0
     
     def get_bet_status(self):
-        """배팅 현황 문자열 생성"""
+        """배팅 현황 문자열 생성 (배팅이 바뀌지 않았으면 캐시 사용)"""
+        if self._status_text is None:
+            self._status_text = self._render_bet_status()
+        return self._status_text
+    
+    def _render_bet_status(self):
         if not self.bets:
             return "아직 배팅이 없습니다."
         
-        status_lines = []
-        total_by_type = {'플레이어': 0, '뱅커': 0, '무승부': 0}
-        
-        for user_id, bet_info in self.bets.items():
-            bet_type = bet_info['type']
-            amount = bet_info['amount']
-            username = bet_info['username']
-            
-            total_by_type[bet_type] += amount
-            status_lines.append(f"👤 {username}: {bet_type} {amount:,}원")
+        # 인원이 많으면 배팅 금액 상위 BET_STATUS_TOP_N명만 표시
+        if len(self.bets) <= BET_STATUS_TOP_N:
+            status_lines = list(self._bet_lines.values())
+        else:
+            status_lines = [self._bet_lines[user_id] for _, user_id in self._ranked[:BET_STATUS_TOP_N]]
+            status_lines.append(f"… 외 {len(self.bets) - BET_STATUS_TOP_N}명")
         
         # 타입별 총합 추가
         summary_lines = []
-        for bet_type, total in total_by_type.items():
+        for bet_type, total in self.totals.items():
             if total > 0:
                 emoji = "👤" if bet_type == "플레이어" else "🏦" if bet_type == "뱅커" else "🤝"
                 summary_lines.append(f"{emoji} {bet_type}: {total:,}원")
@@ -65,73 +93,98 @@ class GameSession:
 class GameManager:
     """멀티플레이어 게임 매니저"""
     
-    def __init__(self, bot_application):
+    def __init__(self, bot_application, user_service=None, game_timer=GAME_TIMER, journal_path=None):
         self.bot = bot_application
-        self.user_service = UserService()
+        self.game_timer = game_timer  # 새 세션의 배팅 시간 (초)
+        self.user_service = user_service or UserService()
         self.active_sessions = {}  # {chat_id: GameSession}
+        self.settling_sessions = {}  # 정산 중이라 active_sessions에서는 빠졌지만 저널에는 열려 있는 세션
         self.game_engine = BaccaratGame()
+        self.shoes = {}  # {chat_id: Shoe}
+        self.scheduler = TimerScheduler()
+        self.dispatcher = MessageDispatcher(bot_application.bot)
+        # 채팅별 세션 변경 직렬화 (사용자 잠금과 함께 잡을 때는 항상 채팅 → 사용자 순서)
+        self.chat_locks = KeyedLocks()
+        self.journal = SessionJournal(journal_path)  # 재시작 후 복구할 세션 기록
+        ACTIVE_SESSIONS.set_function(lambda: len(self.active_sessions))
     
     async def start_game(self, chat_id, user_id, username, bet_type, amount):
-        """게임 시작 또는 배팅 추가"""
-        # 배팅 유효성 검사
-        can_bet, message = self.user_service.can_bet(user_id, amount)
-        if not can_bet:
-            return False, message
-        
-        # 기존 게임 세션이 있는지 확인
-        if chat_id in self.active_sessions:
-            session = self.active_sessions[chat_id]
-            
-            # 게임이 만료되었으면 새 게임 시작
-            if session.is_expired():
-                await self.end_game(chat_id)
-                return await self.start_game(chat_id, user_id, username, bet_type, amount)
-            
-            # 기존 게임에 배팅 추가
-            session.add_bet(user_id, username, bet_type, amount)
-            return True, "배팅이 추가되었습니다."
+        """게임 시작 또는 배팅 추가
         
-        # 새 게임 세션 생성
-        session = GameSession(chat_id)
-        session.add_bet(user_id, username, bet_type, amount)
-        self.active_sessions[chat_id] = session
+        Returns:
+            (성공 여부, 메시지, 배팅 후 잔액)
+        """
+        # 배팅 금액 범위 검사
+        valid, message = self.user_service.check_bet_amount(amount)
+        if not valid:
+            return False, message, None
         
-        # 타이머 시작
-        session.timer_task = asyncio.create_task(self.game_timer(chat_id))
-        
-        return True, "새 게임이 시작되었습니다."
-    
-    async def game_timer(self, chat_id):
-        """게임 타이머 관리"""
-        session = self.active_sessions.get(chat_id)
-        if not session:
-            return
-        
-        try:
-            # 초기 메시지 전송
-            await self.send_game_status(chat_id)
+        async with self.chat_locks.hold(chat_id):
+            # 만료된 게임이 남아 있으면 먼저 정산
+            session = self.active_sessions.get(chat_id)
+            if session and session.is_expired():
+                await self._end_game(chat_id, session)
             
-            # 30초, 10초, 5초 카운트다운
-            countdown_times = [30, 10, 5]
-            
-            while session.is_active and not session.is_expired():
-                remaining = session.get_remaining_time()
+            async with self.user_service.user_locks.hold(user_id):
+                # 잔액 확인과 차감을 한 번의 조건부 UPDATE로 처리
+                balance = await self.user_service.reserve_bet(user_id, amount)
+                if balance is None:
+                    balance = await self.user_service.get_balance(user_id)
+                    return False, f"잔액이 부족합니다. 현재 잔액: {balance}원", balance
                 
-                # 카운트다운 메시지
-                if remaining in countdown_times:
-                    await self.send_countdown_message(chat_id, remaining)
-                    countdown_times.remove(remaining)
+                # 차감 이후 await 없이 세션에 배팅 등록
+                session = self.active_sessions.get(chat_id)
+                if session is None:
+                    session = GameSession(chat_id, self.game_timer)
+                    self.active_sessions[chat_id] = session
+                    self.journal.log_open(session)
+                    self.schedule_session(session)
+                    self.prepare_shoe(chat_id)
+                    message = "새 게임이 시작되었습니다."
+                else:
+                    message = "배팅이 추가되었습니다."
                 
-                await asyncio.sleep(1)
-            
-            # 게임 종료
-            if session.is_active:
-                await self.end_game(chat_id)
+                previous_bet = session.bets.get(user_id)
+                session.add_bet(user_id, username, bet_type, amount)
+                self.journal.log_bet(chat_id, user_id, username, bet_type, amount)
+                # 차감된 배팅금을 재시작 후 환불/정산할 수 있도록 응답 전에 디스크에 기록
+                await self.journal.commit()
+                
+                # 같은 라운드의 이전 배팅을 대체한 경우 이전 금액 반환
+                if previous_bet:
+                    balance = await self.user_service.release_bet(user_id, previous_bet['amount'])
                 
-        except asyncio.CancelledError:
-            pass
-        except Exception as e:
-            print(f"게임 타이머 오류: {e}")
+                return True, message, balance
+    
+    def schedule_session(self, session, announce=True):
+        """새 세션의 마감/카운트다운 시각을 중앙 스케줄러에 등록"""
+        ends_in = session.start_time + session.duration - time.time()
+        
+        session.timers = [self.scheduler.call_later(ends_in, self.on_game_deadline, session)]
+        for remaining in COUNTDOWN_TIMES:
+            if ends_in - remaining > 0:
+                session.timers.append(
+                    self.scheduler.call_later(ends_in - remaining, self.on_countdown, session, remaining)
+                )
+        
+        # 초기 메시지 전송
+        if announce:
+            self.scheduler.call_later(0, self.send_game_status, session.chat_id)
+    
+    def is_current_session(self, session):
+        """세션이 아직 해당 채팅의 진행 중인 게임인지 확인"""
+        return session.is_active and self.active_sessions.get(session.chat_id) is session
+    
+    async def on_countdown(self, session, remaining):
+        """카운트다운 시각 도달"""
+        if self.is_current_session(session):
+            await self.send_countdown_message(session.chat_id, remaining)
+    
+    async def on_game_deadline(self, session):
+        """게임 마감 시각 도달"""
+        if self.is_current_session(session):
+            # 잠금을 기다리는 동안 이 세션이 정산되고 새 라운드가 열릴 수 있으므로 세션을 함께 넘김
+            await self.end_game(session.chat_id, session)
     
     async def send_game_status(self, chat_id):
         """게임 상태 메시지 전송"""
@@ -147,14 +200,11 @@ class GameManager:
             bet_status=bet_status
         )
         
-        try:
-            sent_message = await self.bot.bot.send_message(
-                chat_id=chat_id,
-                text=message
-            )
+        sent_message = await self.dispatcher.send_message(chat_id, message, priority=PRIORITY_NORMAL)
+        if sent_message:
             session.message_id = sent_message.message_id
-        except Exception as e:
-            print(f"메시지 전송 오류: {e}")
+            if self.is_current_session(session):
+                self.journal.log_message(chat_id, session.message_id)
     
     async def send_countdown_message(self, chat_id, remaining_time):
         """카운트다운 메시지 전송"""
@@ -168,78 +218,94 @@ class GameManager:
             bet_status=bet_status
         )
         
-        try:
-            if session.message_id:
-                await self.bot.bot.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=session.message_id,
-                    text=message
-                )
-            else:
-                sent_message = await self.bot.bot.send_message(
-                    chat_id=chat_id,
-                    text=message
-                )
+        if session.message_id:
+            # 전송을 기다리지 않음 (밀린 수정은 디스패처가 최신 내용으로 합침)
+            self.dispatcher.edit_message_text(chat_id, session.message_id, message, priority=PRIORITY_LOW)
+        else:
+            sent_message = await self.dispatcher.send_message(chat_id, message, priority=PRIORITY_LOW)
+            if sent_message:
                 session.message_id = sent_message.message_id
-        except Exception as e:
-            print(f"카운트다운 메시지 오류: {e}")
+                if self.is_current_session(session):
+                    self.journal.log_message(chat_id, session.message_id)
     
-    async def end_game(self, chat_id):
-        """게임 종료 및 결과 처리"""
-        session = self.active_sessions.get(chat_id)
-        if not session:
+    @profiled
+    async def end_game(self, chat_id, session=None):
+        """게임 종료 및 결과 처리
+        
+        session이 주어지면 잠금을 잡은 뒤에도 그 세션이 진행 중일 때만 정산합니다
+        (없으면 호출 시점의 진행 중인 세션).
+        """
+        if session is None:
+            session = self.active_sessions.get(chat_id)
+        async with self.chat_locks.hold(chat_id):
+            await self._end_game(chat_id, session)
+    
+    async def _end_game(self, chat_id, session):
+        """end_game 본체 (채팅 잠금을 잡은 상태에서 호출)"""
+        # 이미 정산되었거나 다른 라운드로 바뀌었으면 무시
+        if session is None or self.active_sessions.get(chat_id) is not session:
             return
         
+        # 정산 중 await 동안 들어오는 배팅은 새 세션으로 가도록 먼저 분리
+        del self.active_sessions[chat_id]
+        self.settling_sessions[chat_id] = session
         session.is_active = False
         
-        # 타이머 태스크 취소
-        if session.timer_task:
-            session.timer_task.cancel()
+        # 남은 타이머 취소
+        for timer in session.timers:
+            self.scheduler.cancel(timer)
+        session.timers = []
         
         # 배팅이 없으면 게임 취소
         if not session.bets:
-            await self.bot.bot.send_message(
-                chat_id=chat_id,
-                text=MESSAGES['no_bets']
-            )
-            del self.active_sessions[chat_id]
+            self.close_journaled_session(chat_id)
+            self.dispatcher.send_message(chat_id, MESSAGES['no_bets'], priority=PRIORITY_HIGH)
             return
         
-        # 게임 진행
-        result = self.game_engine.play_round()
+        ROUND_BETTORS.observe(len(session.bets))
+        settlement_started = time.perf_counter()
+        
+        # 게임 진행 (컷 카드에 도달했으면 미리 섞어 둔 슈로 교체)
+        shoe = self.get_shoe(chat_id)
+        if shoe.needs_new_shoe:
+            shoe.start_new_shoe()
+        result = self.game_engine.play_round(shoe)
         
         # 카드 문자열 생성
         result['player_cards_str'] = self.game_engine.format_cards(result['player_cards'])
         result['banker_cards_str'] = self.game_engine.format_cards(result['banker_cards'])
         
-        # 각 사용자의 결과 처리
+        # 배당금 계산 후 라운드 전체를 한 번에 정산
+        settlements = []
+        for user_id, bet_info in session.bets.items():
+            payout = self.game_engine.calculate_payout(bet_info['amount'], bet_info['type'], result['winner'])
+            settlements.append((user_id, bet_info['amount'], bet_info['type'], payout))
+        
+        balances = await self.user_service.settle_round(settlements, result, chat_id)
+        self.close_journaled_session(chat_id)
+        # 재시작 후 같은 라운드를 다시 정산하지 않도록 결과 전송 전에 기록
+        await self.journal.commit()
+        
+        # 각 사용자의 결과 문구
         results_text = []
         
-        for user_id, bet_info in session.bets.items():
-            bet_type = bet_info['type']
-            bet_amount = bet_info['amount']
-            username = bet_info['username']
+        for user_id, bet_amount, bet_type, payout in settlements:
+            if user_id not in balances:
+                continue
             
-            # 배당금 계산
-            payout = self.game_engine.calculate_payout(bet_amount, bet_type, result['winner'])
+            username = session.bets[user_id]['username']
             
-            # 게임 결과 처리
-            success, new_balance = self.user_service.process_game_result(
-                user_id, bet_amount, bet_type, result, payout
-            )
+            if payout > 0:
+                profit = payout - bet_amount
+                result_emoji = "✅"
+                result_text = f"+{profit:,}원"
+            else:
+                result_emoji = "❌"
+                result_text = f"-{bet_amount:,}원"
             
-            if success:
-                if payout > 0:
-                    profit = payout - bet_amount
-                    result_emoji = "✅"
-                    result_text = f"+{profit:,}원"
-                else:
-                    result_emoji = "❌"
-                    result_text = f"-{bet_amount:,}원"
-                
-                results_text.append(
-                    f"{result_emoji} {username}: {bet_type} {bet_amount:,}원 → {result_text}"
-                )
+            results_text.append(
+                f"{result_emoji} {username}: {bet_type} {bet_amount:,}원 → {result_text}"
+            )
         
         # 결과 메시지 전송
         final_message = MESSAGES['multi_game_result'].format(
@@ -251,16 +317,96 @@ class GameManager:
             results="\n".join(results_text)
         )
         
-        try:
-            await self.bot.bot.send_message(
-                chat_id=chat_id,
-                text=final_message
+        self.dispatcher.send_message(chat_id, final_message, priority=PRIORITY_HIGH)
+        SETTLEMENT_LATENCY.observe(time.perf_counter() - settlement_started)
+        
+        # 다음 슈 준비
+        self.prepare_shoe(chat_id)
+    
+    def close_journaled_session(self, chat_id):
+        """세션 종료를 저널에 기록 (줄이 많이 쌓였으면 열린 세션만 남기고 압축)
+        
+        다른 채팅에서 정산 중인 세션도 배팅금이 이미 차감되었으므로 압축 후에 남깁니다.
+        정산이 실패한 세션은 닫히지 않은 채 남아 재시작 시 복구됩니다.
+        """
+        self.settling_sessions.pop(chat_id, None)
+        self.journal.log_close(chat_id)
+        if self.journal.needs_compaction:
+            self.journal.compact([*self.active_sessions.values(), *self.settling_sessions.values()])
+    
+    async def restore_sessions(self):
+        """저널에 남은 세션 복구 (시작할 때 한 번, 업데이트 처리 전에 호출)
+        
+        - 배팅 시간이 남은 세션: 타이머를 다시 걸어 이어서 진행
+        - 마감이 지난 세션: 바로 정산
+        - 마감 후 SESSION_REFUND_AFTER초가 지난 세션: 정산하지 않고 배팅금 반환
+        
+        Returns:
+            (이어서 진행, 정산, 환불) 세션 수
+        """
+        recovered, self.journal.recovered = self.journal.recovered, {}
+        now = time.time()
+        resumed = settled = 0
+        refunds = {}  # {chat_id: [(user_id, amount), ...]}
+        
+        for chat_id, state in recovered.items():
+            if not state['bets']:
+                self.journal.log_close(chat_id)
+                continue
+            if chat_id in self.active_sessions:
+                refunds[chat_id] = [(user_id, amount) for user_id, (_, _, amount) in state['bets'].items()]
+                continue
+            
+            session = GameSession(chat_id, state['duration'])
+            session.start_time = state['start_time']
+            session.message_id = state['message_id']
+            for user_id, (username, bet_type, amount) in state['bets'].items():
+                session.add_bet(user_id, username, bet_type, amount)
+            
+            overdue = now - (session.start_time + session.duration)
+            if overdue > SESSION_REFUND_AFTER:
+                refunds[chat_id] = [(user_id, bet['amount']) for user_id, bet in session.bets.items()]
+                continue
+            
+            # 슈는 정산할 때 만듦 (채팅이 많아도 복구가 빠르도록)
+            self.active_sessions[chat_id] = session
+            if overdue >= 0:
+                session.timers = [self.scheduler.call_later(0, self.on_game_deadline, session)]
+                settled += 1
+            else:
+                # 배팅 현황 메시지가 있으면 카운트다운이 그 메시지를 수정
+                self.schedule_session(session, announce=session.message_id is None)
+                resumed += 1
+        
+        if refunds:
+            await self.user_service.refund_bets(
+                [refund for chat_refunds in refunds.values() for refund in chat_refunds]
             )
-        except Exception as e:
-            print(f"결과 메시지 전송 오류: {e}")
+            for chat_id, chat_refunds in refunds.items():
+                self.journal.log_close(chat_id)
+            await self.journal.commit()
+            for chat_id, chat_refunds in refunds.items():
+                self.dispatcher.send_message(chat_id, MESSAGES['session_refunded'].format(
+                    amount=sum(amount for _, amount in chat_refunds), count=len(chat_refunds)
+                ), priority=PRIORITY_HIGH)
         
-        # 세션 정리
-        del self.active_sessions[chat_id]
+        if recovered:
+            print(f"게임 세션 복구: 진행 {resumed}개, 정산 {settled}개, 환불 {len(refunds)}개")
+        return resumed, settled, len(refunds)
+    
+    def get_shoe(self, chat_id):
+        """채팅별 슈 조회 (없으면 생성)"""
+        shoe = self.shoes.get(chat_id)
+        if shoe is None:
+            shoe = self.shoes[chat_id] = Shoe()
+        return shoe
+    
+    def prepare_shoe(self, chat_id):
+        """다음 슈가 없으면 백그라운드 스레드에서 미리 섞기"""
+        shoe = self.get_shoe(chat_id)
+        if shoe.next_cards is None and not shoe.preparing:
+            shoe.preparing = True
+            asyncio.get_running_loop().run_in_executor(None, shoe.prepare_next_shoe)
     
     def get_active_game(self, chat_id):
         """활성 게임 세션 조회"""
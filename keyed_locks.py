@@ -0,0 +1,37 @@
+import asyncio
+import contextlib
+
+class KeyedLocks:
+    """키(사용자 ID, 채팅 ID 등)별 asyncio.Lock
+    
+    사용 중이거나 기다리는 코루틴이 있는 키만 보관하고, 마지막 사용자가 놓으면 지웁니다.
+    여러 키는 항상 정렬된 순서로 잡으므로 같은 KeyedLocks 안에서는 교착이 생기지 않습니다.
+    같은 코루틴이 이미 잡은 키를 다시 잡으면 교착되므로 (재진입 불가) 호출 구조로 피해야 합니다.
+    """
+    
+    def __init__(self):
+        self._locks = {}  # {key: [Lock, 보유/대기 중인 코루틴 수]}
+    
+    @contextlib.asynccontextmanager
+    async def hold(self, *keys):
+        """keys의 잠금을 모두 잡은 동안 실행 (중복 키는 한 번만)"""
+        entries = []
+        held = 0
+        try:
+            for key in sorted(set(keys)):
+                entry = self._locks.get(key)
+                if entry is None:
+                    entry = self._locks[key] = [asyncio.Lock(), 0]
+                entry[1] += 1
+                entries.append((key, entry))
+                await entry[0].acquire()
+                held += 1
+            yield
+        finally:
+            for index in range(len(entries) - 1, -1, -1):
+                key, entry = entries[index]
+                if index < held:
+                    entry[0].release()
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
@@ -0,0 +1,214 @@
+import math
+import random
+
+_MAX_LEVELS = 24  # 약 1,600만 항목까지 O(log n)
+
+class _Node:
+    __slots__ = ('value', 'next', 'width')
+    
+    def __init__(self, value, next, width):
+        self.value = value
+        self.next = next    # 레벨별 다음 노드
+        self.width = width  # 레벨별 다음 노드까지 건너뛰는 항목 수
+
+# 모든 키보다 큰 끝 노드
+_TAIL = _Node((math.inf, math.inf), [], [])
+
+class IndexableSkiplist:
+    """위치(순위)로도 접근할 수 있는 정렬 스킵 리스트
+    
+    각 링크가 건너뛰는 항목 수를 함께 저장해 삽입/삭제/순위 조회가 모두 기대 O(log n)입니다.
+    값은 서로 달라야 합니다 (순위표는 (-점수, user_id)를 사용).
+    """
+    
+    def __init__(self, values=()):
+        """values를 정렬해 O(n)으로 구성 (레벨은 위치의 2진 끝자리 0 개수로 정함)"""
+        values = sorted(values)
+        self.size = len(values)
+        self.head = _Node(None, [_TAIL] * _MAX_LEVELS, [0] * _MAX_LEVELS)
+        
+        last = [self.head] * _MAX_LEVELS
+        last_position = [0] * _MAX_LEVELS
+        for position, value in enumerate(values, 1):
+            levels = min(_MAX_LEVELS, (position & -position).bit_length())
+            node = _Node(value, [None] * levels, [0] * levels)
+            for level in range(levels):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level] = node
+                last_position[level] = position
+        for level in range(_MAX_LEVELS):
+            last[level].next[level] = _TAIL
+            last[level].width[level] = self.size + 1 - last_position[level]
+    
+    def __len__(self):
+        return self.size
+    
+    def __iter__(self):
+        node = self.head.next[0]
+        while node is not _TAIL:
+            yield node.value
+            node = node.next[0]
+    
+    def insert(self, value):
+        chain = [None] * _MAX_LEVELS
+        steps_at_level = [0] * _MAX_LEVELS
+        node = self.head
+        for level in range(_MAX_LEVELS - 1, -1, -1):
+            while node.next[level].value <= value:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        
+        levels = min(_MAX_LEVELS, 1 - int(math.log2(1.0 - random.random())))
+        new_node = _Node(value, [None] * levels, [0] * levels)
+        steps = 0
+        for level in range(levels):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, _MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+    
+    def remove(self, value):
+        chain = [None] * _MAX_LEVELS
+        node = self.head
+        for level in range(_MAX_LEVELS - 1, -1, -1):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        
+        target = chain[0].next[0]
+        if target.value != value:
+            raise KeyError(value)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), _MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+    
+    def index(self, value):
+        """value 앞에 있는 항목 수 (없으면 KeyError)"""
+        node = self.head
+        position = 0
+        for level in range(_MAX_LEVELS - 1, -1, -1):
+            while node.next[level].value < value:
+                position += node.width[level]
+                node = node.next[level]
+        if node.next[0].value != value:
+            raise KeyError(value)
+        return position
+
+class Leaderboard:
+    """점수 높은 순 순위표 (같은 점수는 user_id 순)"""
+    
+    def __init__(self, scores=()):
+        self.scores = dict(scores)  # {user_id: 점수}
+        self._index = IndexableSkiplist((-score, user_id) for user_id, score in self.scores.items())
+    
+    def __len__(self):
+        return len(self.scores)
+    
+    def __contains__(self, user_id):
+        return user_id in self.scores
+    
+    def update(self, user_id, score):
+        previous = self.scores.get(user_id)
+        if previous == score:
+            return
+        if previous is not None:
+            self._index.remove((-previous, user_id))
+        self.scores[user_id] = score
+        self._index.insert((-score, user_id))
+    
+    def add(self, user_id, delta):
+        self.update(user_id, self.scores.get(user_id, 0) + delta)
+    
+    def rank(self, user_id):
+        """1부터 시작하는 순위 (순위표에 없으면 None)"""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return self._index.index((-score, user_id)) + 1
+    
+    def top(self, limit):
+        """[(user_id, 점수), ...] 상위 limit개"""
+        result = []
+        for negative_score, user_id in self._index:
+            if len(result) >= limit:
+                break
+            result.append((user_id, -negative_score))
+        return result
+
+class Rankings:
+    """잔액/순이익 순위표 (전체 + 채팅별)
+    
+    잔액은 BalanceLedger의 변경 콜백(on_balance)으로, 순이익은 라운드 정산(on_round)으로
+    갱신합니다. 채팅별 순위표에는 그 채팅에서 배팅한 적이 있는 사용자만 들어갑니다.
+    """
+    
+    def __init__(self):
+        self.balance = Leaderboard()
+        self.profit = Leaderboard()
+        self.chat_balance = {}  # {chat_id: Leaderboard}
+        self.chat_profit = {}   # {chat_id: Leaderboard}
+        self._user_chats = {}   # {user_id: {chat_id, ...}}
+    
+    def load(self, balances, profits, chat_profits):
+        """DB 스냅샷으로 다시 구성
+        
+        Args:
+            balances: [(user_id, 잔액), ...]
+            profits: [(user_id, 순이익), ...]
+            chat_profits: [(chat_id, user_id, 채팅 내 순이익), ...]
+        """
+        self.balance = Leaderboard(balances)
+        self.profit = Leaderboard(profits)
+        
+        members = {}
+        self._user_chats = {}
+        for chat_id, user_id, net in chat_profits:
+            members.setdefault(chat_id, []).append((user_id, net))
+            self._user_chats.setdefault(user_id, set()).add(chat_id)
+        
+        self.chat_profit = {chat_id: Leaderboard(entries) for chat_id, entries in members.items()}
+        self.chat_balance = {
+            chat_id: Leaderboard(
+                (user_id, self.balance.scores[user_id]) for user_id, _ in entries if user_id in self.balance
+            )
+            for chat_id, entries in members.items()
+        }
+    
+    def on_balance(self, user_id, balance):
+        """잔액 변경 (원장 콜백)"""
+        self.balance.update(user_id, balance)
+        for chat_id in self._user_chats.get(user_id, ()):
+            self.chat_balance[chat_id].update(user_id, balance)
+    
+    def on_round(self, chat_id, results):
+        """라운드 정산 결과 [(user_id, 순이익 변화), ...] 반영"""
+        for user_id, delta in results:
+            self.profit.add(user_id, delta)
+            if chat_id is None:
+                continue
+            
+            chats = self._user_chats.setdefault(user_id, set())
+            if chat_id not in chats:
+                chats.add(chat_id)
+                self.chat_balance.setdefault(chat_id, Leaderboard())
+                self.chat_profit.setdefault(chat_id, Leaderboard())
+                if user_id in self.balance:
+                    self.chat_balance[chat_id].update(user_id, self.balance.scores[user_id])
+            self.chat_profit[chat_id].add(user_id, delta)
+    
+    def boards(self, chat_id=None):
+        """(잔액 순위표, 순이익 순위표) - chat_id가 있으면 해당 채팅"""
+        if chat_id is None:
+            return self.balance, self.profit
+        return self.chat_balance.get(chat_id, Leaderboard()), self.chat_profit.get(chat_id, Leaderboard())
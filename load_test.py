@@ -0,0 +1,264 @@
+"""
+바카라 봇 부하 테스트
+
+fake_bot_api.FakeBotAPI를 띄우고 bot.build_application으로 만든 실제 Application을
+그 서버에 연결한 뒤, 여러 그룹 채팅의 가상 사용자들이 /banker, /player, /tie 배팅을
+보내게 합니다. 실제 Telegram API에는 접속하지 않으며 DB는 임시 디렉터리에 만듭니다.
+
+측정 항목:
+- 업데이트 → 답장 지연: 명령어 업데이트를 넣은 시각부터 그 메시지에 대한 답장까지
+- 라운드 정산 시간: GameManager.end_game 실행 시간
+- 결과 전달 지연: 정산 시작부터 결과 메시지가 서버에 도착할 때까지
+- 발신 메시지 속도: 초당 sendMessage/editMessageText 호출 수
+
+    python load_test.py --users 2000 --chats 200 --duration 60 --round-seconds 20
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import deque, Counter
+import bot
+from fake_bot_api import FakeBotAPI
+from user_service import UserService
+from config import MIN_BET, MESSAGES
+
+TEST_TOKEN = "123456:LOAD-TEST"
+BET_COMMANDS = ("banker", "player", "tie")
+RESULT_HEADER = MESSAGES['multi_game_result'].split('\n', 1)[0]
+
+def percentiles(values):
+    """지연 목록(초)의 백분위수 (밀리초)"""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+    
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+    
+    return {
+        'count': len(ordered),
+        'p50': pick(0.50),
+        'p90': pick(0.90),
+        'p99': pick(0.99),
+        'max': ordered[-1] * 1000
+    }
+
+class LoadStats:
+    """서버에 도착한 발신 호출로 지연/처리량 집계"""
+    
+    def __init__(self):
+        self.pending = {}          # {(chat_id, message_id): (보낸 시각, 명령어)}
+        self.private_pending = {}  # {chat_id: deque[message_id]} (개인 채팅 답장은 인용 없음)
+        self.latencies = {}        # {명령어: [초]}
+        self.outbound = []         # 발신 호출 시각
+        self.outbound_methods = Counter()
+        self.settlements = []      # end_game 실행 시간
+        self.result_lags = []      # 정산 시작 → 결과 메시지
+        self.settling = {}         # {chat_id: 정산 시작 시각}
+    
+    def sent(self, chat_id, message_id, command):
+        self.pending[(chat_id, message_id)] = (time.perf_counter(), command)
+        if chat_id > 0:
+            self.private_pending.setdefault(chat_id, deque()).append(message_id)
+    
+    def on_outbound(self, method, params, result):
+        now = time.perf_counter()
+        self.outbound.append(now)
+        self.outbound_methods[method] += 1
+        if method.lower() != 'sendmessage':
+            return
+        
+        chat_id = int(params['chat_id'])
+        if params.get('text', '').startswith(RESULT_HEADER) and chat_id in self.settling:
+            self.result_lags.append(now - self.settling.pop(chat_id))
+        
+        reply_to = None
+        if 'reply_parameters' in params:
+            reply_to = json.loads(params['reply_parameters']).get('message_id')
+        elif 'reply_to_message_id' in params:
+            reply_to = int(params['reply_to_message_id'])
+        elif chat_id > 0 and self.private_pending.get(chat_id):
+            reply_to = self.private_pending[chat_id].popleft()
+        
+        entry = self.pending.pop((chat_id, reply_to), None)
+        if entry:
+            sent_at, command = entry
+            self.latencies.setdefault(command, []).append(now - sent_at)
+    
+    def outbound_rate(self, started, finished):
+        """평균/최대 초당 발신 호출 수"""
+        seconds = max(finished - started, 1e-9)
+        per_second = Counter(int(t - started) for t in self.outbound if started <= t <= finished)
+        return {
+            'total': len(self.outbound),
+            'methods': dict(self.outbound_methods),
+            'average_per_second': len(self.outbound) / seconds,
+            'peak_per_second': max(per_second.values(), default=0)
+        }
+
+def instrument_end_game(manager, stats):
+    """GameManager.end_game 실행 시간 측정"""
+    end_game = manager.end_game
+    
+    async def timed_end_game(chat_id, session=None):
+        session = session or manager.active_sessions.get(chat_id)
+        started = time.perf_counter()
+        if session and session.bets:
+            stats.settling[chat_id] = started
+        await end_game(chat_id, session)
+        if session and session.bets:
+            stats.settlements.append(time.perf_counter() - started)
+    
+    manager.end_game = timed_end_game
+
+async def wait_until(condition, timeout, interval=0.1):
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        await asyncio.sleep(interval)
+    return condition()
+
+async def simulate_user(server, stats, rng, user, chat_id, think_time, stop_at):
+    """stop_at까지 평균 think_time초 간격으로 배팅"""
+    while True:
+        await asyncio.sleep(rng.expovariate(1 / think_time))
+        if time.perf_counter() >= stop_at:
+            return
+        command = rng.choice(BET_COMMANDS)
+        amount = MIN_BET * rng.randint(1, 10)
+        message_id = server.push_message(chat_id, user, f"/{command} {amount}")
+        stats.sent(chat_id, message_id, command)
+
+async def run_load_test(users, chats, duration, round_seconds, think_time, seed):
+    rng = random.Random(seed)
+    random.seed(seed)
+    stats = LoadStats()
+    
+    with tempfile.TemporaryDirectory(prefix="baccarat-load-") as workdir:
+        server = FakeBotAPI()
+        await server.start()
+        server.listeners.append(stats.on_outbound)
+        
+        service = UserService(os.path.join(workdir, 'load.db'), os.path.join(workdir, 'load.ledger'))
+        application = bot.build_application(
+            TEST_TOKEN, server.base_url, service, round_seconds, os.path.join(workdir, 'load.sessions')
+        )
+        instrument_end_game(bot.game_manager, stats)
+        
+        await application.initialize()
+        await application.start()
+        await application.updater.start_polling(poll_interval=0, timeout=5, allowed_updates=bot.ALLOWED_UPDATES)
+        
+        profiles = [
+            {'id': user_id, 'first_name': f"Tester{user_id}", 'username': f"tester{user_id}"}
+            for user_id in range(1, users + 1)
+        ]
+        
+        # 1) 개인 채팅에서 /start로 가입
+        print(f"사용자 {users:,}명 가입 중...")
+        for user in profiles:
+            stats.sent(user['id'], server.push_message(user['id'], user, "/start"), "start")
+        if not await wait_until(lambda: not stats.private_pending or not any(stats.private_pending.values()),
+                                timeout=60 + users / 50):
+            print("⚠️ 일부 /start 답장이 도착하지 않았습니다.")
+        
+        # 2) 그룹 채팅에서 배팅
+        print(f"{chats:,}개 채팅에서 {duration}초 동안 배팅 (라운드 {round_seconds}초)...")
+        started = time.perf_counter()
+        stop_at = started + duration
+        tasks = [
+            asyncio.create_task(simulate_user(
+                server, stats, rng, user, -(index % chats + 1), think_time, stop_at
+            ))
+            for index, user in enumerate(profiles)
+        ]
+        await asyncio.gather(*tasks)
+        finished = time.perf_counter()
+        
+        # 남은 답장과 진행 중인 라운드 정산 대기
+        await wait_until(
+            lambda: not bot.game_manager.active_sessions and not stats.settling,
+            timeout=round_seconds + 30
+        )
+        await wait_until(lambda: not bot.game_manager.dispatcher.pending_count, timeout=30)
+        unanswered = sum(1 for _, command in stats.pending.values() if command != "start")
+        
+        await application.updater.stop()
+        await application.stop()
+        await bot.post_stop(application)
+        await application.shutdown()
+        await bot.post_shutdown(application)
+        await server.close()
+        service.db.close()
+    
+    return {
+        'config': {
+            'users': users, 'chats': chats, 'duration': duration,
+            'round_seconds': round_seconds, 'think_time': think_time, 'seed': seed
+        },
+        'reply_latency_ms': {command: percentiles(values) for command, values in stats.latencies.items()},
+        'unanswered': unanswered,
+        'settlement_ms': percentiles(stats.settlements),
+        'result_delivery_ms': percentiles(stats.result_lags),
+        'outbound': stats.outbound_rate(started, finished),
+        'dispatcher': {
+            'sent': bot.game_manager.dispatcher.sent_count,
+            'failed': bot.game_manager.dispatcher.failed_count,
+            'coalesced': bot.game_manager.dispatcher.coalesced_count
+        }
+    }
+
+def print_report(report):
+    def line(name, stats):
+        if not stats.get('count'):
+            print(f"  {name:12} -")
+            return
+        print(f"  {name:12} n={stats['count']:<7,} p50 {stats['p50']:8.1f}  p90 {stats['p90']:8.1f}  "
+              f"p99 {stats['p99']:8.1f}  max {stats['max']:8.1f} ms")
+    
+    print("\n=== 부하 테스트 결과 ===")
+    print("업데이트 → 답장 지연:")
+    for command, stats in report['reply_latency_ms'].items():
+        line(f"/{command}", stats)
+    print(f"  답장 없음: {report['unanswered']:,}건")
+    print("라운드:")
+    line("정산", report['settlement_ms'])
+    line("결과 전달", report['result_delivery_ms'])
+    outbound = report['outbound']
+    print(f"발신: {outbound['total']:,}건, 평균 {outbound['average_per_second']:.1f}/초, "
+          f"최대 {outbound['peak_per_second']}/초 {outbound['methods']}")
+    print(f"디스패처: {report['dispatcher']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="바카라 봇 부하 테스트 (로컬 Bot API 대역 서버 사용)")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=60, help="배팅을 보내는 시간 (초)")
+    parser.add_argument('--round-seconds', type=float, default=20, help="라운드 배팅 시간 (초)")
+    parser.add_argument('--think-time', type=float, default=10, help="사용자별 평균 배팅 간격 (초)")
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--output', help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+    
+    # 요청마다 찍히는 HTTP 로그는 끔
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    
+    report = asyncio.run(run_load_test(
+        args.users, args.chats, args.duration, args.round_seconds, args.think_time, args.seed
+    ))
+    print_report(report)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n결과 저장: {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,350 @@
+import asyncio
+import datetime
+from collections import OrderedDict, deque
+from telegram.error import RetryAfter, BadRequest, NetworkError, TelegramError
+from config import (OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST,
+                    OUTBOUND_CONCURRENCY, OUTBOUND_MAX_RETRIES, OUTBOUND_RETRY_BACKOFF, OUTBOUND_DRAIN_TIMEOUT)
+from metrics import OUTBOUND_SENT, OUTBOUND_FAILURES
+
+# 전송 우선순위 (숫자가 작을수록 먼저 전송)
+PRIORITY_HIGH = 0    # 게임 결과
+PRIORITY_NORMAL = 1  # 게임 시작 안내 등
+PRIORITY_LOW = 2     # 카운트다운
+
+# close()에서 워커/전송 작업이 끝나기를 기다릴 최대 시간 (초)
+_STOP_TIMEOUT = 5
+# 쉬고 있는 채팅의 토큰 버킷/전송 제한 기록을 정리하는 주기 (초)
+_PRUNE_INTERVAL = 60
+
+class TokenBucket:
+    """초당 rate개, 최대 capacity개까지 쌓이는 토큰 버킷"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+    
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+    
+    def wait_time(self, now):
+        """토큰 하나를 쓰기까지 기다려야 하는 시간 (초)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+    
+    def consume(self):
+        self.tokens -= 1
+
+class OutboundMessage:
+    """전송 대기 중인 Bot API 호출"""
+    __slots__ = ('method', 'chat_id', 'kwargs', 'priority', 'future', 'attempts')
+    
+    def __init__(self, method, chat_id, kwargs, priority, future):
+        self.method = method
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+
+class MessageDispatcher:
+    """텔레그램 발신 메시지 큐
+    
+    - 전역/채팅별 토큰 버킷으로 Telegram flood 제한 이하로 전송
+    - RetryAfter를 받으면 해당 채팅을 그 시간만큼 멈춘 뒤 재전송
+    - 네트워크 오류는 채팅을 OUTBOUND_RETRY_BACKOFF초부터 시도마다 2배씩 멈춘 뒤 재전송
+    - 같은 메시지에 대한 수정이 여러 개 대기 중이면 마지막 내용만 전송
+    - 우선순위가 높은 메시지(결과)가 낮은 메시지(카운트다운)보다 먼저 전송
+    
+    send_message/edit_message_text는 Future를 반환하며, 전송 결과(Message)
+    또는 실패 시 None으로 완료됩니다. 결과가 필요 없으면 기다리지 않아도 됩니다.
+    """
+    
+    def __init__(self, bot, global_rate=OUTBOUND_GLOBAL_RATE):
+        self.bot = bot
+        self.global_rate = global_rate  # 전체 초당 전송 수 (여러 프로세스가 토큰을 나눠 쓰면 1/N)
+        # 우선순위별 {chat_id: deque[OutboundMessage]} (채팅 간 라운드 로빈)
+        self._queues = [OrderedDict() for _ in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)]
+        self._pending_edits = {}    # {(chat_id, message_id): OutboundMessage}
+        self._chat_buckets = {}     # {chat_id: TokenBucket}
+        self._chat_blocked_until = {}
+        self._next_prune = 0
+        self._in_flight = set()     # 전송 중인 chat_id (채팅 내 순서 보장)
+        self._global_bucket = None
+        self._wakeup = None
+        self._worker = None
+        self._semaphore = None
+        self._tasks = set()
+        self._closing = False
+        
+        self.queued_count = 0
+        self.sent_count = 0
+        self.failed_count = 0
+        self.coalesced_count = 0
+    
+    def send_message(self, chat_id, text, priority=PRIORITY_NORMAL, **kwargs):
+        """메시지 전송 예약"""
+        kwargs['text'] = text
+        return self._enqueue('send_message', chat_id, kwargs, priority).future
+    
+    def edit_message_text(self, chat_id, message_id, text, priority=PRIORITY_LOW, **kwargs):
+        """메시지 수정 예약 (같은 메시지의 대기 중인 수정은 최신 내용으로 대체)"""
+        key = (chat_id, message_id)
+        pending = self._pending_edits.get(key)
+        if pending is not None:
+            pending.kwargs.update(kwargs, text=text)
+            self.coalesced_count += 1
+            # 더 급한 수정이 합쳐지면 우선순위도 올림
+            if priority < pending.priority:
+                self._remove(pending)
+                pending.priority = priority
+                self._push(pending)
+            return pending.future
+        
+        kwargs.update(message_id=message_id, text=text)
+        job = self._enqueue('edit_message_text', chat_id, kwargs, priority)
+        self._pending_edits[key] = job
+        return job.future
+    
+    @property
+    def pending_count(self):
+        return sum(len(jobs) for queue in self._queues for jobs in queue.values())
+    
+    def _enqueue(self, method, chat_id, kwargs, priority):
+        loop = asyncio.get_running_loop()
+        job = OutboundMessage(method, chat_id, kwargs, priority, loop.create_future())
+        if self._closing:
+            # 종료 후 들어온 메시지는 보내지 않음
+            self._resolve(job, None)
+            return job
+        self._push(job)
+        self.queued_count += 1
+        self._ensure_worker()
+        return job
+    
+    def _push(self, job, front=False):
+        queue = self._queues[job.priority].setdefault(job.chat_id, deque())
+        if front:
+            queue.appendleft(job)
+        else:
+            queue.append(job)
+        if self._wakeup:
+            self._wakeup.set()
+    
+    def _remove(self, job):
+        queue = self._queues[job.priority].get(job.chat_id)
+        if queue is not None:
+            queue.remove(job)
+            if not queue:
+                del self._queues[job.priority][job.chat_id]
+    
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(OUTBOUND_CONCURRENCY)
+            if self._global_bucket is None:
+                self._global_bucket = TokenBucket(self.global_rate, self.global_rate, loop.time())
+            self._worker = asyncio.create_task(self._run())
+    
+    def _chat_wait_time(self, chat_id, now):
+        """채팅에 다음 메시지를 보낼 수 있을 때까지 남은 시간"""
+        if chat_id in self._in_flight:
+            return None  # 전송 완료 시 다시 깨움
+        wait = self._chat_blocked_until.get(chat_id, 0) - now
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, now)
+        return max(wait, bucket.wait_time(now), 0)
+    
+    def _block_chat(self, chat_id, seconds):
+        """채팅 전송을 seconds초 동안 멈춤 (이미 더 길게 멈춰 있으면 유지)"""
+        until = asyncio.get_running_loop().time() + seconds
+        if until > self._chat_blocked_until.get(chat_id, 0):
+            self._chat_blocked_until[chat_id] = until
+    
+    def _prune_chat_state(self, now):
+        """대기/전송 중인 메시지가 없고 버킷이 가득 찬 채팅과 지난 전송 제한 기록 제거"""
+        queued = set()
+        for queue in self._queues:
+            queued.update(queue)
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            if chat_id in queued or chat_id in self._in_flight:
+                continue
+            bucket.wait_time(now)  # 토큰 충전
+            if bucket.tokens >= bucket.capacity:
+                del self._chat_buckets[chat_id]
+        for chat_id, until in list(self._chat_blocked_until.items()):
+            if until <= now:
+                del self._chat_blocked_until[chat_id]
+    
+    def _next_job(self, now):
+        """지금 보낼 수 있는 가장 급한 메시지, 없으면 (None, 대기 시간)"""
+        if now >= self._next_prune:
+            self._prune_chat_state(now)
+            self._next_prune = now + _PRUNE_INTERVAL
+        
+        wait = self._global_bucket.wait_time(now)
+        if wait > 0:
+            return None, wait
+        
+        min_wait = None
+        for queue in self._queues:
+            for chat_id in queue:
+                chat_wait = self._chat_wait_time(chat_id, now)
+                if chat_wait is None:
+                    continue
+                if chat_wait == 0:
+                    jobs = queue[chat_id]
+                    job = jobs.popleft()
+                    if jobs:
+                        queue.move_to_end(chat_id)
+                    else:
+                        del queue[chat_id]
+                    return job, 0
+                if min_wait is None or chat_wait < min_wait:
+                    min_wait = chat_wait
+        return None, min_wait
+    
+    async def _run(self):
+        """전송 워커 (_closing이 켜지면 종료)
+        
+        wait_for가 _wakeup과 같은 반복에서 끝나면 취소가 무시될 수 있으므로(3.11)
+        종료는 취소 대신 _closing 플래그로 알립니다.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while not self._closing:
+                await self._semaphore.acquire()
+                if self._closing:
+                    self._semaphore.release()
+                    break
+                job, wait = self._next_job(loop.time())
+                if job is None:
+                    self._semaphore.release()
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                
+                self._global_bucket.consume()
+                self._chat_buckets[job.chat_id].consume()
+                self._in_flight.add(job.chat_id)
+                if job.method == 'edit_message_text':
+                    key = (job.chat_id, job.kwargs['message_id'])
+                    if self._pending_edits.get(key) is job:
+                        del self._pending_edits[key]
+                task = asyncio.create_task(self._deliver(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except asyncio.CancelledError:
+            pass
+    
+    async def _deliver(self, job):
+        """Bot API 호출 및 재시도 처리"""
+        job.attempts += 1
+        try:
+            result = await getattr(self.bot, job.method)(chat_id=job.chat_id, **job.kwargs)
+            self.sent_count += 1
+            OUTBOUND_SENT.inc(job.method)
+            self._resolve(job, result)
+        except asyncio.CancelledError:
+            # close()가 기한을 넘긴 전송을 취소
+            self._resolve(job, None)
+            raise
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if isinstance(retry_after, datetime.timedelta):
+                retry_after = retry_after.total_seconds()
+            self._block_chat(job.chat_id, retry_after)
+            self._retry(job, f"전송 제한 {retry_after}초")
+        except BadRequest as e:
+            if 'not modified' in str(e).lower():
+                self._resolve(job, None)
+            else:
+                self._fail(job, e)
+        except NetworkError as e:
+            # 연결 장애 중에 재시도를 몇 ms 안에 모두 쓰지 않도록 지수 백오프
+            self._block_chat(job.chat_id, OUTBOUND_RETRY_BACKOFF * 2 ** (job.attempts - 1))
+            self._retry(job, e)
+        except TelegramError as e:
+            self._fail(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        finally:
+            self._in_flight.discard(job.chat_id)
+            self._semaphore.release()
+            self._wakeup.set()
+    
+    def _retry(self, job, reason):
+        if job.attempts >= OUTBOUND_MAX_RETRIES:
+            self._fail(job, reason)
+            return
+        
+        if job.method == 'edit_message_text':
+            key = (job.chat_id, job.kwargs['message_id'])
+            newer = self._pending_edits.get(key)
+            if newer is not None:
+                # 더 최신 수정이 이미 대기 중이면 이 수정은 버리고 결과를 연결
+                newer.future.add_done_callback(
+                    lambda f: self._resolve(job, None if f.cancelled() else f.result())
+                )
+                return
+            self._pending_edits[key] = job
+        self._push(job, front=True)
+    
+    def _fail(self, job, error):
+        self.failed_count += 1
+        OUTBOUND_FAILURES.inc(job.method)
+        print(f"메시지 전송 실패 ({job.method}, chat {job.chat_id}): {error}")
+        self._resolve(job, None)
+    
+    @staticmethod
+    def _resolve(job, result):
+        if not job.future.done():
+            job.future.set_result(result)
+    
+    async def close(self, timeout=OUTBOUND_DRAIN_TIMEOUT):
+        """대기 중인 메시지를 최대 timeout초 동안 보낸 뒤 워커 종료
+        
+        시간 안에 보내지 못한 메시지는 버리고 Future를 None으로 완료합니다.
+        """
+        if self._worker is None:
+            self._closing = True
+            return
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not self._worker.done():
+            # 재시도로 큐에 돌아온 메시지도 다시 모아서 기다림
+            pending = [job.future for queue in self._queues for jobs in queue.values() for job in jobs]
+            pending += self._tasks
+            remaining = deadline - loop.time()
+            if not pending or remaining <= 0:
+                break
+            await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        
+        # 남은 메시지를 버리고 워커에 종료 알림
+        self._closing = True
+        dropped = [job for queue in self._queues for jobs in queue.values() for job in jobs]
+        for queue in self._queues:
+            queue.clear()
+        self._pending_edits.clear()
+        for job in dropped:
+            self._resolve(job, None)
+        if dropped:
+            print(f"종료로 보내지 못한 메시지: {len(dropped)}건")
+        
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        self._wakeup.set()
+        _, not_done = await asyncio.wait([self._worker, *tasks], timeout=_STOP_TIMEOUT)
+        if not_done:
+            print(f"발신 워커가 {_STOP_TIMEOUT}초 안에 종료되지 않았습니다: {len(not_done)}개")
+            for task in not_done:
+                task.cancel()
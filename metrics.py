@@ -0,0 +1,200 @@
+"""
+Prometheus 텍스트 형식 메트릭
+
+외부 라이브러리 없이 카운터/게이지/히스토그램을 메모리에 모으고, flask로 만든
+/metrics 엔드포인트를 별도 스레드에서 제공합니다. DB 스레드와 이벤트 루프에서 동시에
+기록하므로 각 메트릭은 자체 잠금을 씁니다.
+"""
+
+import abc
+import time
+import bisect
+import functools
+import threading
+from config import METRICS_HOST, METRICS_PORT
+
+# 지연 시간용 기본 버킷 (초)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Metric(abc.ABC):
+    """메트릭 공통 (이름, 설명, 라벨)"""
+    kind = None
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+    
+    @abc.abstractmethod
+    def samples(self):
+        """[(이름 접미사, 라벨 값, 추가 라벨, 값)]"""
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """증가만 하는 값"""
+    kind = "counter"
+    
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+    
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def samples(self):
+        with self._lock:
+            return [("", labels, (), value) for labels, value in self._values.items()]
+
+class Gauge(Metric):
+    """현재 값"""
+    kind = "gauge"
+    
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._function = None
+    
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+    
+    def set_function(self, function):
+        """수집 시점에 function()으로 값을 구함 (라벨 없는 게이지)"""
+        self._function = function
+    
+    def samples(self):
+        if self._function:
+            return [("", (), (), self._function())]
+        with self._lock:
+            return [("", labels, (), value) for labels, value in self._values.items()]
+
+class Histogram(Metric):
+    """구간별 누적 관측 수 + 합계"""
+    kind = "histogram"
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # {labels: [구간별 관측 수 (+Inf 포함), 합계]}
+    
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+    
+    def samples(self):
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        
+        samples = []
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(("_bucket", labels, (("le", _format_value(float(bound))),), cumulative))
+            samples.append(("_sum", labels, (), total))
+            samples.append(("_count", labels, (), cumulative))
+        return samples
+
+class Registry:
+    """등록된 메트릭 모음"""
+    
+    def __init__(self):
+        self._metrics = []
+    
+    def register(self, metric):
+        self._metrics.append(metric)
+    
+    def render(self):
+        """Prometheus 텍스트 형식"""
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+REGISTRY = Registry()
+
+# ---------------------------------------------------------------- 봇 메트릭
+
+HANDLER_LATENCY = Histogram(
+    'baccarat_handler_seconds', '명령어/콜백 핸들러 처리 시간', ('handler',)
+)
+HANDLER_ERRORS = Counter(
+    'baccarat_handler_errors_total', '핸들러에서 처리되지 않은 예외 수', ('handler',)
+)
+DB_QUERY_LATENCY = Histogram(
+    'baccarat_db_query_seconds', 'DB 스레드에서의 Database 메서드 실행 시간', ('method',)
+)
+ACTIVE_SESSIONS = Gauge(
+    'baccarat_active_sessions', '진행 중인 게임 세션 수'
+)
+ROUND_BETTORS = Histogram(
+    'baccarat_round_bettors', '라운드별 배팅 인원', buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+SETTLEMENT_LATENCY = Histogram(
+    'baccarat_settlement_seconds', '라운드 정산 시간 (카드 딜부터 결과 메시지 예약까지)'
+)
+OUTBOUND_SENT = Counter(
+    'baccarat_outbound_sent_total', '전송에 성공한 Bot API 호출 수', ('method',)
+)
+OUTBOUND_FAILURES = Counter(
+    'baccarat_outbound_failures_total', '재시도 후에도 실패한 Bot API 호출 수', ('method',)
+)
+
+def track_handler(func):
+    """BotHandler 코루틴의 처리 시간/예외를 handler 라벨로 기록"""
+    name = func.__name__
+    
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+    
+    return wrapper
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """/metrics 엔드포인트를 데몬 스레드에서 시작, 서버 반환"""
+    from flask import Flask, Response
+    from werkzeug.serving import make_server
+    
+    app = Flask(__name__)
+    
+    @app.route('/metrics')
+    def metrics():
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    
+    server = make_server(host, port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,233 @@
+"""
+실행 중 켜고 끌 수 있는 프로파일링과 느린 쿼리 로그
+
+- profiled: 핸들러/end_game 같은 코루틴의 실행 시간을 이름별로 집계 (꺼져 있으면
+  플래그 확인 한 번만 하고 그대로 호출)
+- 샘플링을 켜면 이벤트 루프 스레드와 DB 스레드를 cProfile로 함께 기록
+  (Python 3.12+의 cProfile은 sys.monitoring 기반이라 한 번에 하나만 켤 수 있고 모든
+  스레드를 기록하므로, 이벤트 루프 스레드의 프로파일 하나로 DB 스레드까지 기록)
+- DB 메서드가 SLOW_QUERY_MS를 넘으면 실행된 SQL, 파라미터, EXPLAIN QUERY PLAN을 로그로 남김
+
+켜기/끄기는 시그널로 합니다 (재시작 불필요):
+    kill -USR1 <pid>   프로파일링 켜기/끄기 (끌 때 PROFILE_REPORT_PATH에 리포트 저장)
+    kill -USR2 <pid>   지금까지의 리포트 저장
+
+    python profiling.py   프로파일링을 켠 채 DB 쿼리 실행 점검
+"""
+
+import io
+import sys
+import time
+import signal
+import pstats
+import sqlite3
+import cProfile
+import logging
+import functools
+import threading
+from config import PROFILING_SAMPLING, PROFILE_REPORT_PATH, SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+# EXPLAIN QUERY PLAN을 붙일 수 있는 문장
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+# 스레드마다 따로 cProfile을 켤 수 있는지 (3.12+는 프로파일 하나가 모든 스레드를 기록)
+_PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+class Profiler:
+    """이름별 실행 시간 집계와 cProfile 샘플링 상태"""
+    
+    def __init__(self):
+        self.enabled = False
+        self.sampling = False
+        self.slow_query_seconds = SLOW_QUERY_MS / 1000 if SLOW_QUERY_MS else None
+        self.started_at = None
+        self._timings = {}  # {이름: [호출 수, 합계, 최대]}
+        self._lock = threading.Lock()
+        self._main_profile = None  # 이벤트 루프 스레드
+        self._db_profile = None    # DB 스레드 (AsyncDatabase가 사용, 3.11 이하)
+    
+    def enable(self, sampling=PROFILING_SAMPLING):
+        """프로파일링 시작 (이벤트 루프 스레드에서 호출)"""
+        if self.enabled:
+            return
+        with self._lock:
+            self._timings = {}
+        self.started_at = time.time()
+        self.sampling = sampling
+        if sampling:
+            self._db_profile = cProfile.Profile() if _PER_THREAD_PROFILES else None
+            self._main_profile = cProfile.Profile()
+            self._main_profile.enable()
+        self.enabled = True
+    
+    def disable(self):
+        """프로파일링 종료"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self._main_profile:
+            self._main_profile.disable()
+    
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+            self.save_report()
+        else:
+            self.enable()
+        print(f"프로파일링 {'시작' if self.enabled else '종료'}")
+    
+    def record(self, name, elapsed):
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                self._timings[name] = [1, elapsed, elapsed]
+            else:
+                timing[0] += 1
+                timing[1] += elapsed
+                if elapsed > timing[2]:
+                    timing[2] = elapsed
+    
+    def run_db_call(self, func, *args, **kwargs):
+        """DB 스레드에서 func 실행 (샘플링 중이면 cProfile로 기록)"""
+        profile = self._db_profile
+        if self.sampling and profile is not None:
+            return profile.runcall(func, *args, **kwargs)
+        return func(*args, **kwargs)
+    
+    def report(self, limit=30):
+        """실행 시간 집계 + cProfile 상위 함수"""
+        with self._lock:
+            timings = sorted(self._timings.items(), key=lambda item: item[1][1], reverse=True)
+        
+        lines = []
+        if self.started_at:
+            lines.append(f"프로파일링 시작: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at))}")
+        lines += ["=== 실행 시간 (이름별) ===",
+                 f"{'이름':48} {'호출':>8} {'합계 ms':>12} {'평균 ms':>10} {'최대 ms':>10}"]
+        for name, (count, total, maximum) in timings:
+            lines.append(f"{name:48} {count:8} {total * 1000:12.2f} {total / count * 1000:10.3f} {maximum * 1000:10.3f}")
+        
+        profiles = [profile for profile in (self._main_profile, self._db_profile) if profile is not None]
+        if profiles:
+            output = io.StringIO()
+            try:
+                stats = pstats.Stats(profiles[0], stream=output)
+                for profile in profiles[1:]:
+                    stats.add(profile)
+                stats.sort_stats('cumulative').print_stats(limit)
+                lines.append("\n=== cProfile (누적 시간 상위) ===")
+                lines.append(output.getvalue())
+            except TypeError:
+                pass  # 아직 기록된 호출이 없음
+        return "\n".join(lines)
+    
+    def save_report(self, path=PROFILE_REPORT_PATH):
+        """리포트를 파일로 저장"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.report())
+        print(f"프로파일 리포트 저장: {path}")
+
+PROFILER = Profiler()
+
+def profiled(func):
+    """코루틴 실행 시간을 qualname으로 집계 (프로파일링이 켜져 있을 때만)"""
+    name = func.__qualname__
+    
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not PROFILER.enabled:
+            return await func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            PROFILER.record(name, time.perf_counter() - started)
+    
+    return wrapper
+
+def install_signal_handlers():
+    """SIGUSR1: 켜기/끄기, SIGUSR2: 리포트 저장 (지원하는 플랫폼만)"""
+    if not hasattr(signal, 'SIGUSR1'):
+        return False
+    signal.signal(signal.SIGUSR1, lambda signum, frame: PROFILER.toggle())
+    signal.signal(signal.SIGUSR2, lambda signum, frame: PROFILER.save_report())
+    return True
+
+class ProfiledConnection(sqlite3.Connection):
+    """느린 쿼리 로그용으로 execute/executemany의 SQL과 파라미터를 기록하는 연결
+    
+    statements가 None이면 기록하지 않고 그대로 실행합니다.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = None  # [(sql, 파라미터, 실행 건수, 소요 시간)]
+    
+    def execute(self, sql, parameters=()):
+        statements = self.statements
+        if statements is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        cursor = super().execute(sql, parameters)
+        statements.append((sql, parameters, 1, time.perf_counter() - started))
+        return cursor
+    
+    def executemany(self, sql, seq_of_parameters):
+        statements = self.statements
+        if statements is None:
+            return super().executemany(sql, seq_of_parameters)
+        seq_of_parameters = list(seq_of_parameters)
+        started = time.perf_counter()
+        cursor = super().executemany(sql, seq_of_parameters)
+        first = seq_of_parameters[0] if seq_of_parameters else ()
+        statements.append((sql, first, len(seq_of_parameters), time.perf_counter() - started))
+        return cursor
+
+def log_slow_query(conn, method_name, elapsed, statements):
+    """느린 DB 메서드의 SQL/파라미터/쿼리 계획 로그"""
+    lines = [f"느린 쿼리: Database.{method_name} {elapsed * 1000:.1f}ms"]
+    for sql, parameters, rows, statement_elapsed in statements:
+        sql_text = " ".join(sql.split())
+        suffix = f" (executemany {rows}건, 첫 행)" if rows > 1 else ""
+        lines.append(f"  [{statement_elapsed * 1000:.1f}ms] {sql_text}")
+        lines.append(f"    파라미터{suffix}: {parameters!r:.200}")
+        if sql_text.upper().startswith(_EXPLAINABLE):
+            try:
+                plan = conn.execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+                for row in plan:
+                    lines.append(f"    계획: {row[-1]}")
+            except sqlite3.Error as e:
+                lines.append(f"    계획 조회 실패: {e}")
+    logger.warning("\n".join(lines))
+
+# 테스트 함수
+async def test_profiling():
+    """샘플링 프로파일링을 켠 채 DB 스레드에서 쿼리 실행"""
+    import os
+    import tempfile
+    from database import Database, AsyncDatabase
+    # python profiling.py로 실행하면 이 모듈은 __main__이므로 DB가 쓰는 모듈의 PROFILER 사용
+    from profiling import PROFILER as profiler, _PER_THREAD_PROFILES as per_thread
+    
+    print("=== 프로파일링 테스트 ===")
+    with tempfile.TemporaryDirectory() as directory:
+        db = AsyncDatabase(Database(os.path.join(directory, 'profiling_test.db')))
+        profiler.enable(sampling=True)
+        try:
+            await db.create_user(1, "profiler")
+            user = await db.get_user(1)
+        finally:
+            profiler.disable()
+        db.close()
+    
+    assert user and user['user_id'] == 1, user
+    report = profiler.report()
+    assert "Database.get_user" in report, report
+    print(f"Python {sys.version_info.major}.{sys.version_info.minor}: 프로파일링 중 DB 쿼리 정상 "
+          f"(DB 스레드 별도 프로파일: {per_thread})")
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(test_profiling())
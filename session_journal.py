@@ -0,0 +1,146 @@
+import os
+import json
+import asyncio
+from config import SESSION_JOURNAL_PATH, SESSION_JOURNAL_COMPACT_LINES
+
+class SessionJournal:
+    """진행 중인 게임 세션의 추가 전용 저널
+    
+    세션이 바뀔 때마다 한 줄(JSON 배열)을 덧붙이고, 시작 시 재생해 종료되지 않은
+    세션을 복구합니다. 줄 수가 SESSION_JOURNAL_COMPACT_LINES를 넘으면 열려 있는
+    세션만 다시 기록해 파일을 압축합니다.
+    
+        ["open", chat_id, 시작 시각, 배팅 시간, message_id, [[user_id, 이름, 종류, 금액], ...]]
+        ["bet", chat_id, user_id, 이름, 종류, 금액]
+        ["msg", chat_id, message_id]
+        ["close", chat_id]
+    
+    매 줄은 flush만 하고, 배팅 응답이나 결과 전송 전에 commit()으로 fsync합니다.
+    그 사이 여러 채팅에서 쓴 줄은 fsync 한 번으로 함께 기록됩니다 (group commit).
+    """
+    
+    def __init__(self, path=None):
+        self.path = path or SESSION_JOURNAL_PATH
+        self.recovered = self.replay()  # {chat_id: 복구할 세션 상태}
+        self._lines = 0
+        self._compact_at = SESSION_JOURNAL_COMPACT_LINES
+        self._journal = None
+        self._written = 0        # 쓴 줄 수 (압축과 무관하게 계속 증가)
+        self._synced = 0         # 그중 fsync된 줄 수
+        self._sync_task = None   # 진행 중인 fsync
+        self.compact(())
+    
+    def replay(self):
+        """저널을 읽어 닫히지 않은 세션 상태 반환"""
+        sessions = {}
+        if not os.path.exists(self.path):
+            return sessions
+        
+        with open(self.path, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                    op, chat_id = record[0], record[1]
+                except (ValueError, IndexError):
+                    continue  # 기록 도중 중단된 마지막 줄
+                
+                if op == 'open':
+                    _, _, start_time, duration, message_id, bets = record
+                    sessions[chat_id] = {
+                        'start_time': start_time,
+                        'duration': duration,
+                        'message_id': message_id,
+                        'bets': {user_id: (username, bet_type, amount) for user_id, username, bet_type, amount in bets}
+                    }
+                elif op == 'close':
+                    sessions.pop(chat_id, None)
+                elif chat_id not in sessions:
+                    continue
+                elif op == 'bet':
+                    _, _, user_id, username, bet_type, amount = record
+                    sessions[chat_id]['bets'][user_id] = (username, bet_type, amount)
+                elif op == 'msg':
+                    sessions[chat_id]['message_id'] = record[2]
+        return sessions
+    
+    def _write(self, record):
+        self._journal.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+        self._journal.flush()
+        self._lines += 1
+        self._written += 1
+    
+    async def commit(self):
+        """지금까지 쓴 줄이 디스크에 기록될 때까지 대기"""
+        target = self._written
+        while self._synced < target:
+            if self._sync_task is None or self._sync_task.done():
+                self._sync_task = asyncio.ensure_future(self._sync())
+            await asyncio.shield(self._sync_task)
+    
+    async def _sync(self):
+        """저널 fsync 한 번 (시작 시점까지 쓴 줄을 모두 포함)"""
+        written = self._written
+        # 압축으로 파일이 바뀌어도 fsync하는 동안 닫히지 않도록 복제한 fd 사용
+        fd = os.dup(self._journal.fileno())
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, os.fsync, fd)
+        finally:
+            os.close(fd)
+        self._synced = max(self._synced, written)
+    
+    @staticmethod
+    def _open_record(chat_id, start_time, duration, message_id, bets):
+        return ['open', chat_id, start_time, duration, message_id, bets]
+    
+    def log_open(self, session):
+        """새 세션 (배팅 전)"""
+        self._write(self._open_record(session.chat_id, session.start_time, session.duration, session.message_id, []))
+    
+    def log_bet(self, chat_id, user_id, username, bet_type, amount):
+        """배팅 추가/대체"""
+        self._write(['bet', chat_id, user_id, username, bet_type, amount])
+    
+    def log_message(self, chat_id, message_id):
+        """배팅 현황 메시지 ID"""
+        self._write(['msg', chat_id, message_id])
+    
+    def log_close(self, chat_id):
+        """정산/취소/환불로 끝난 세션"""
+        self._write(['close', chat_id])
+    
+    @property
+    def needs_compaction(self):
+        return self._lines >= self._compact_at
+    
+    def compact(self, sessions):
+        """열려 있는 세션(GameSession, 아직 복구하지 않은 세션 포함)만 남기고 다시 기록"""
+        records = [
+            self._open_record(chat_id, state['start_time'], state['duration'], state['message_id'],
+                              [[user_id, *bet] for user_id, bet in state['bets'].items()])
+            for chat_id, state in self.recovered.items()
+        ]
+        records += [
+            self._open_record(session.chat_id, session.start_time, session.duration, session.message_id,
+                              [[user_id, bet['username'], bet['type'], bet['amount']]
+                               for user_id, bet in session.bets.items()])
+            for session in sessions
+        ]
+        
+        if self._journal:
+            self._journal.close()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as journal:
+            journal.writelines(
+                json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n" for record in records
+            )
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temp_path, self.path)
+        self._journal = open(self.path, 'a', encoding='utf-8')
+        self._lines = len(records)
+        self._synced = self._written  # 열린 세션은 모두 새 파일에 fsync됨
+        # 열린 세션이 많아도 압축이 연달아 일어나지 않도록
+        self._compact_at = max(SESSION_JOURNAL_COMPACT_LINES, 2 * len(records))
+    
+    def close(self):
+        self._journal.close()
@@ -0,0 +1,321 @@
+"""
+채팅 ID 기준 멀티 프로세스 실행 (SHARD_WORKERS > 0)
+
+    프론트 프로세스 1개   업데이트 수신(polling/webhook) 후 chat_id % N 번 워커 큐로 전달
+    워커 프로세스 N개     각자 Application/GameManager/세션을 갖고 핸들러 실행, 메시지 전송
+    원장 프로세스 1개     UserService(DB + BalanceLedger)를 혼자 소유하고 워커의 호출을 처리
+
+같은 채팅의 업데이트는 항상 같은 워커로 가므로 게임 세션은 프로세스 간에 공유하지 않고,
+잔액과 DB 변경은 원장 프로세스 하나에서만 일어납니다. 워커는 RemoteUserService로
+UserService의 비동기 메서드를 이름으로 호출합니다.
+
+발신 메시지는 워커마다 따로 보내므로 전체 초당 전송 수(OUTBOUND_GLOBAL_RATE)는 워커 수로
+나눠 씁니다. 메트릭을 켜면 워커 i는 METRICS_PORT + 1 + i 에서 제공하고, 게임 세션 저널은
+SESSION_JOURNAL_PATH.i 에 따로 기록합니다 (워커 수는 진행 중인 세션이 없을 때 바꿔야 함).
+"""
+
+import time
+import signal
+import asyncio
+import inspect
+import itertools
+import threading
+import multiprocessing
+from queue import Full
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+import bot
+from user_service import UserService
+from keyed_locks import KeyedLocks
+from metrics import start_metrics_server
+from config import (BOT_TOKEN, SHARD_WORKERS, SHARD_SHUTDOWN_TIMEOUT, UPDATE_QUEUE_SIZE, OUTBOUND_GLOBAL_RATE,
+                    SESSION_JOURNAL_PATH, METRICS_ENABLED, METRICS_HOST, METRICS_PORT)
+
+# 워커가 원장 프로세스에 호출할 수 있는 UserService 메서드 (close는 원장 프로세스가 직접)
+REMOTE_METHODS = frozenset(
+    name for name, member in vars(UserService).items()
+    if inspect.iscoroutinefunction(member) and not name.startswith('_') and name != 'close'
+)
+
+def shard_for(chat_id, workers):
+    """chat_id를 처리할 워커 번호 (음수 그룹 ID도 0..workers-1)"""
+    return chat_id % workers
+
+# ---------------------------------------------------------------- 원장 프로세스
+
+def run_ledger_server(connections, db_path=None, journal_path=None):
+    """원장 프로세스 진입점: 모든 워커 연결이 닫힐 때까지 UserService 호출 처리"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # 종료 순서는 프론트 프로세스가 정함
+    asyncio.run(_serve_ledger(connections, db_path, journal_path))
+
+async def _serve_ledger(connections, db_path, journal_path):
+    loop = asyncio.get_running_loop()
+    service = UserService(db_path, journal_path)
+    await service.load_rankings()
+    tasks = set()
+    
+    async def handle(connection, send_lock, call_id, method, args, kwargs):
+        try:
+            if method not in REMOTE_METHODS:
+                raise AttributeError(f"원격 호출할 수 없는 메서드: {method}")
+            response = (call_id, True, await getattr(service, method)(*args, **kwargs))
+        except Exception as e:
+            response = (call_id, False, e)
+        with send_lock:
+            try:
+                connection.send(response)
+            except (OSError, ValueError):
+                pass  # 워커가 이미 종료됨
+            except Exception as e:
+                # 예외 객체를 pickle할 수 없는 경우
+                connection.send((call_id, False, RuntimeError(repr(e))))
+    
+    def spawn(connection, send_lock, request):
+        task = loop.create_task(handle(connection, send_lock, *request))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    
+    def read(connection, finished):
+        # 연결마다 스레드 하나로 요청을 받아 이벤트 루프에서 실행 (한 이벤트 루프 = 원장 작업 직렬화)
+        send_lock = threading.Lock()
+        while True:
+            try:
+                request = connection.recv()
+            except (EOFError, OSError):
+                break
+            if request is None:
+                # 워커 종료 신호: 확인 응답 후 연결 종료
+                with send_lock:
+                    connection.send(None)
+                break
+            loop.call_soon_threadsafe(spawn, connection, send_lock, request)
+        loop.call_soon_threadsafe(finished.set_result, None)
+    
+    finished = [loop.create_future() for _ in connections]
+    for connection, future in zip(connections, finished):
+        threading.Thread(target=read, args=(connection, future), name="ledger-reader", daemon=True).start()
+    
+    await asyncio.gather(*finished)
+    if tasks:
+        await asyncio.gather(*tasks)
+    await service.close()
+    service.db.close()
+
+# ---------------------------------------------------------------- 워커 쪽 클라이언트
+
+class LedgerClient:
+    """원장 프로세스와의 연결 (호출 ID로 응답을 Future에 연결)"""
+    
+    def __init__(self, connection):
+        self.connection = connection
+        self._calls = {}  # {호출 ID: Future}
+        self._ids = itertools.count()
+        self._loop = None
+        self._reader = None
+    
+    def _start(self):
+        self._loop = asyncio.get_running_loop()
+        self._reader = threading.Thread(target=self._read, name="ledger-client", daemon=True)
+        self._reader.start()
+    
+    def _read(self):
+        while True:
+            try:
+                response = self.connection.recv()
+            except (EOFError, OSError):
+                response = None
+            if response is None:
+                self._loop.call_soon_threadsafe(self._fail_all)
+                return
+            self._loop.call_soon_threadsafe(self._resolve, *response)
+    
+    def _resolve(self, call_id, ok, value):
+        future = self._calls.pop(call_id, None)
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+    
+    def _fail_all(self):
+        calls, self._calls = self._calls, {}
+        for future in calls.values():
+            if not future.done():
+                future.set_exception(ConnectionError("원장 프로세스와의 연결이 끊어졌습니다."))
+    
+    async def call(self, method, *args, **kwargs):
+        """원장 프로세스에서 service.method(*args, **kwargs) 실행 결과"""
+        if self._loop is None:
+            self._start()
+        call_id = next(self._ids)
+        future = self._loop.create_future()
+        self._calls[call_id] = future
+        self.connection.send((call_id, method, args, kwargs))
+        return await future
+    
+    async def close(self):
+        """종료 신호를 보내고 원장 프로세스의 확인 응답을 기다림"""
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        if self._reader is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._reader.join, 10)
+        self.connection.close()
+
+class RemoteUserService:
+    """워커 프로세스용 UserService (비동기 메서드는 원장 프로세스에서 실행)"""
+    
+    # 상태를 쓰지 않는 동기 메서드는 워커에서 바로 실행
+    check_bet_amount = UserService.check_bet_amount
+    
+    def __init__(self, client):
+        self.client = client
+        # 워커 안의 배팅 선차감/반환 직렬화 (출석/송금은 원장 프로세스의 잠금을 사용)
+        self.user_locks = KeyedLocks()
+    
+    def __getattr__(self, name):
+        if name not in REMOTE_METHODS:
+            raise AttributeError(name)
+        
+        async def remote_call(*args, **kwargs):
+            return await self.client.call(name, *args, **kwargs)
+        
+        remote_call.__name__ = name
+        return remote_call
+    
+    async def close(self):
+        await self.client.close()
+
+# ---------------------------------------------------------------- 워커 프로세스
+
+def run_worker(index, workers, queue, connection, token=BOT_TOKEN, base_url=None, game_timer=None):
+    """워커 프로세스 진입점: 큐로 받은 업데이트를 자기 Application에서 처리"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if METRICS_ENABLED:
+        start_metrics_server(METRICS_HOST, METRICS_PORT + 1 + index)
+    asyncio.run(_serve_worker(index, workers, queue, connection, token, base_url, game_timer))
+
+async def _serve_worker(index, workers, queue, connection, token, base_url, game_timer):
+    loop = asyncio.get_running_loop()
+    application = bot.build_application(
+        token, base_url, RemoteUserService(LedgerClient(connection)), game_timer,
+        session_journal_path=f"{SESSION_JOURNAL_PATH}.{index}"
+    )
+    bot.game_manager.dispatcher.global_rate = OUTBOUND_GLOBAL_RATE / workers
+    
+    await application.initialize()
+    # 순위표는 원장 프로세스가 시작할 때 이미 구성하므로 세션 복구만
+    await bot.game_manager.restore_sessions()
+    await application.start()
+    while True:
+        data = await loop.run_in_executor(None, queue.get)
+        if data is None:
+            break
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    
+    await application.stop()
+    await bot.post_stop(application)
+    await bot.post_shutdown(application)
+    await application.shutdown()
+
+# ---------------------------------------------------------------- 프론트 프로세스
+
+class _WorkerQueues(list):
+    """워커 큐 목록 (종료 신호를 보냈는지 기록)"""
+    stopping = False
+
+def stop_workers(queues):
+    """워커에 종료 신호 (여러 번 호출해도 한 번만 보냄)
+    
+    큐가 가득 찬 채 멈춘 워커는 신호를 받지 못해도 run_sharded에서 강제 종료됩니다.
+    """
+    if queues.stopping:
+        return
+    queues.stopping = True
+    deadline = time.monotonic() + SHARD_SHUTDOWN_TIMEOUT
+    for worker_queue in queues:
+        try:
+            worker_queue.put(None, timeout=max(0, deadline - time.monotonic()))
+        except Full:
+            pass
+
+def build_front_application(queues, token=BOT_TOKEN, base_url=None):
+    """업데이트를 chat_id별 워커 큐로 넘기기만 하는 Application
+    
+    PTB는 updater(getUpdates/웹훅)와 Application을 멈춘 뒤 post_stop을 호출하므로,
+    워커 종료 신호는 더 이상 업데이트가 들어오지 않을 때 보내집니다.
+    """
+    async def post_stop(application):
+        stop_workers(queues)
+    
+    builder = (
+        Application.builder()
+        .token(token)
+        .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+        .post_stop(post_stop)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
+    
+    async def forward(update: Update, context):
+        # 워커 큐가 가득 차면 여기서 기다리고, 그동안 update_queue가 차서 수신도 늦춰짐
+        chat = update.effective_chat
+        worker_queue = queues[shard_for(chat.id if chat else 0, len(queues))]
+        await asyncio.get_running_loop().run_in_executor(None, worker_queue.put, update.to_dict())
+    
+    application.add_handler(TypeHandler(Update, forward))
+    return application
+
+def run_sharded(workers=SHARD_WORKERS, token=BOT_TOKEN, base_url=None, game_timer=None,
+                db_path=None, journal_path=None):
+    """원장/워커 프로세스를 띄우고 이 프로세스에서 업데이트를 받아 분배 (종료 시까지 실행)"""
+    context = multiprocessing.get_context('spawn')
+    pipes = [context.Pipe() for _ in range(workers)]
+    queues = _WorkerQueues(context.Queue(maxsize=UPDATE_QUEUE_SIZE) for _ in range(workers))
+    
+    ledger = context.Process(
+        target=run_ledger_server, name="ledger",
+        args=([ledger_end for _, ledger_end in pipes], db_path, journal_path)
+    )
+    processes = [
+        context.Process(
+            target=run_worker, name=f"worker-{index}",
+            args=(index, workers, queues[index], pipes[index][0], token, base_url, game_timer)
+        )
+        for index in range(workers)
+    ]
+    ledger.start()
+    for process in processes:
+        process.start()
+    # 자식에게 넘긴 연결은 닫아야 한쪽이 종료될 때 다른 쪽이 EOF를 받음
+    for worker_end, ledger_end in pipes:
+        worker_end.close()
+        ledger_end.close()
+    
+    try:
+        bot.run_application(build_front_application(queues, token, base_url))
+    finally:
+        # 프론트가 정상 종료되지 못한 경우에도 종료 신호 (이미 보냈으면 무시)
+        stop_workers(queues)
+        # 워커가 모두 끝나야 원장 연결이 닫혀 원장 프로세스가 종료됨
+        deadline = time.monotonic() + SHARD_SHUTDOWN_TIMEOUT
+        for process in processes:
+            _join_or_terminate(process, deadline)
+        _join_or_terminate(ledger, time.monotonic() + SHARD_SHUTDOWN_TIMEOUT)
+
+def _join_or_terminate(process, deadline):
+    """deadline까지 기다리고 그래도 살아 있으면 강제 종료
+    
+    원장 프로세스를 강제 종료해도 잔액 변경은 fsync된 저널에 남아 다음 시작 시 복구됩니다.
+    """
+    process.join(max(0, deadline - time.monotonic()))
+    if process.is_alive():
+        print(f"{process.name} 프로세스가 {SHARD_SHUTDOWN_TIMEOUT}초 안에 종료되지 않아 강제 종료합니다.")
+        process.terminate()
+        process.join(5)
+        if process.is_alive():
+            process.kill()
+            process.join()
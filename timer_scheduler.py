@@ -0,0 +1,117 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+
+class Timer:
+    """예약된 타이머 (TimerScheduler.cancel/reschedule에 사용)"""
+    __slots__ = ('when', 'callback', 'args', 'cancelled')
+    
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+class TimerScheduler:
+    """모든 게임 마감/카운트다운 시각을 관리하는 힙 기반 중앙 스케줄러
+    
+    채팅마다 1초 간격으로 깨어나는 대신, 가장 이른 마감 시각에 대해서만
+    이벤트 루프 타이머 하나를 걸어 두고 그 시각이 되었을 때만 깨어납니다.
+    취소된 타이머는 힙에서 바로 빼지 않고 꺼낼 때 건너뜁니다.
+    """
+    
+    def __init__(self):
+        self._heap = []  # [(when, seq, Timer)]
+        self._seq = itertools.count()
+        self._cancelled = 0
+        self._wakeup = None      # 이벤트 루프 TimerHandle
+        self._wakeup_at = None
+        self._tasks = set()      # 실행 중인 코루틴 콜백 (GC 방지)
+    
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+    
+    def call_at(self, when, callback, *args):
+        """루프 시각 when에 callback 실행 (코루틴 함수면 태스크로 실행)"""
+        timer = Timer(when, callback, args)
+        heapq.heappush(self._heap, (when, next(self._seq), timer))
+        self._arm()
+        return timer
+    
+    def call_later(self, delay, callback, *args):
+        """delay초 후 callback 실행"""
+        loop = asyncio.get_running_loop()
+        return self.call_at(loop.time() + max(0, delay), callback, *args)
+    
+    def cancel(self, timer):
+        """타이머 취소"""
+        if timer is None or timer.cancelled:
+            return
+        timer.cancelled = True
+        self._cancelled += 1
+        
+        # 취소된 항목이 절반을 넘으면 힙 정리
+        if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+    
+    def reschedule(self, timer, when):
+        """타이머를 새 시각으로 이동, 새 Timer 반환"""
+        self.cancel(timer)
+        return self.call_at(when, timer.callback, *timer.args)
+    
+    def _arm(self):
+        """가장 이른 타이머 시각에 맞춰 루프 타이머 재설정"""
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+        
+        if not self._heap:
+            if self._wakeup:
+                self._wakeup.cancel()
+                self._wakeup = self._wakeup_at = None
+            return
+        
+        when = self._heap[0][0]
+        if self._wakeup_at is not None and self._wakeup_at <= when:
+            return
+        
+        if self._wakeup:
+            self._wakeup.cancel()
+        loop = asyncio.get_running_loop()
+        self._wakeup = loop.call_at(when, self._run_due)
+        self._wakeup_at = when
+    
+    def _run_due(self):
+        """시각이 된 타이머 실행"""
+        self._wakeup = self._wakeup_at = None
+        now = asyncio.get_running_loop().time()
+        
+        while self._heap and self._heap[0][0] <= now:
+            _, _, timer = heapq.heappop(self._heap)
+            if timer.cancelled:
+                self._cancelled -= 1
+                continue
+            timer.cancelled = True  # 실행된 타이머는 다시 취소되지 않도록 표시
+            try:
+                if inspect.iscoroutinefunction(timer.callback):
+                    task = asyncio.create_task(self._run_task(timer))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                else:
+                    timer.callback(*timer.args)
+            except Exception as e:
+                print(f"타이머 실행 오류: {e}")
+        
+        self._arm()
+    
+    @staticmethod
+    async def _run_task(timer):
+        try:
+            await timer.callback(*timer.args)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"타이머 실행 오류: {e}")
@@ -1,121 +1,281 @@
-from database import Database
-from config import MIN_BET, MAX_BET, DAILY_ATTENDANCE_REWARD, WEEKLY_BONUS
+import asyncio
+from collections import OrderedDict
+from database import Database, AsyncDatabase
+from balance_ledger import BalanceLedger
+from keyed_locks import KeyedLocks
+from leaderboard import Rankings
+from config import (MIN_BET, MAX_BET, DAILY_ATTENDANCE_REWARD, WEEKLY_BONUS,
+                    HISTORY_PAGE_SIZE, HISTORY_CACHE_USERS, HISTORY_CACHE_PAGES, LEADERBOARD_TOP_N)
 import datetime
 
 class UserService:
     """사용자 관리 서비스"""
     
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db_path=None, journal_path=None):
+        self.db = AsyncDatabase(Database(db_path))
+        # 잔액/순이익 순위표 (원장의 모든 잔액 변경이 on_balance로 반영됨)
+        self.rankings = Rankings()
+        self.ledger = BalanceLedger(self.db, journal_path, on_change=self.rankings.on_balance)
+        # 여러 단계(조회 → 변경 → 기록)로 된 사용자별 작업 직렬화
+        self.user_locks = KeyedLocks()
+        # 렌더링한 게임 기록 페이지 {user_id: {(before_id, after_id): 페이지}} (사용자 단위 LRU)
+        self._history_pages = OrderedDict()
     
-    def register_user(self, user_id, username=None, first_name=None, last_name=None):
-        """사용자 등록"""
-        return self.db.create_user(user_id, username, first_name, last_name)
+    async def close(self):
+        """남은 잔액 변경을 DB에 반영하고 종료"""
+        await self.ledger.close()
     
-    def get_user_info(self, user_id):
-        """사용자 정보 조회"""
-        return self.db.get_user(user_id)
+    async def register_user(self, user_id, username=None, first_name=None, last_name=None):
+        """사용자 등록 (처음 보는 사용자는 잔액 순위표에도 추가)"""
+        created = await self.db.create_user(user_id, username, first_name, last_name)
+        if created and user_id not in self.rankings.balance:
+            balance = await self.ledger.get_balance(user_id)
+            if balance is not None:
+                self.rankings.on_balance(user_id, balance)
+        return created
     
-    def get_balance(self, user_id):
+    async def load_rankings(self):
+        """DB에서 순위표 재구성 (시작 시, 아직 DB에 쓰지 않은 원장 잔액 우선)"""
+        balances, profits, chat_profits = await self.db.get_ranking_snapshot()
+        balances = dict(balances)
+        balances.update(self.ledger.balances)
+        self.rankings.load(balances.items(), profits, chat_profits)
+        return len(balances)
+    
+    async def get_user_info(self, user_id):
+        """사용자 정보 조회 (잔액은 원장 기준)"""
+        user = await self.db.get_user(user_id)
+        if user:
+            user['balance'] = await self.ledger.get_balance(user_id)
+        return user
+    
+    async def get_balance(self, user_id):
         """사용자 잔액 조회"""
-        user = self.db.get_user(user_id)
-        return user['balance'] if user else 0
+        balance = await self.ledger.get_balance(user_id)
+        return balance if balance is not None else 0
     
-    def update_balance(self, user_id, new_balance):
+    async def update_balance(self, user_id, new_balance):
         """잔액 업데이트"""
-        return self.db.update_balance(user_id, new_balance)
+        return await self.ledger.set_balance(user_id, new_balance)
     
-    def add_balance(self, user_id, amount):
+    async def add_balance(self, user_id, amount):
         """잔액 추가"""
-        current_balance = self.get_balance(user_id)
-        new_balance = current_balance + amount
-        return self.update_balance(user_id, new_balance)
+        return await self.ledger.credit(user_id, amount) is not None
     
-    def subtract_balance(self, user_id, amount):
+    async def subtract_balance(self, user_id, amount):
         """잔액 차감"""
-        current_balance = self.get_balance(user_id)
-        if current_balance >= amount:
-            new_balance = current_balance - amount
-            return self.update_balance(user_id, new_balance)
-        return False
+        return await self.ledger.debit(user_id, amount) is not None
     
-    def can_bet(self, user_id, bet_amount):
-        """베팅 가능 여부 확인"""
+    async def reserve_bet(self, user_id, amount):
+        """배팅 금액 선차감 (원장에서 확인과 차감을 한 번에 처리)
+        
+        Returns:
+            차감 후 잔액, 잔액이 부족하면 None
+        """
+        return await self.ledger.debit(user_id, amount)
+    
+    async def release_bet(self, user_id, amount):
+        """선차감한 배팅 금액 반환, 반환 후 잔액"""
+        return await self.ledger.credit(user_id, amount)
+    
+    async def refund_bets(self, refunds):
+        """중단된 라운드의 배팅금 일괄 반환
+        
+        Args:
+            refunds: [(user_id, amount), ...]
+        
+        Returns:
+            {user_id: 반환 후 잔액}
+        """
+        return await self.ledger.credit_many(refunds)
+    
+    def check_bet_amount(self, bet_amount):
+        """베팅 금액 범위 확인"""
         if bet_amount < MIN_BET or bet_amount > MAX_BET:
             return False, f"베팅 금액은 {MIN_BET}원 ~ {MAX_BET}원 사이여야 합니다."
+        return True, "베팅 가능"
+    
+    async def can_bet(self, user_id, bet_amount):
+        """베팅 가능 여부 확인"""
+        valid, message = self.check_bet_amount(bet_amount)
+        if not valid:
+            return False, message
         
-        current_balance = self.get_balance(user_id)
+        current_balance = await self.get_balance(user_id)
         if current_balance < bet_amount:
             return False, f"잔액이 부족합니다. 현재 잔액: {current_balance}원"
         
         return True, "베팅 가능"
     
-    def process_game_result(self, user_id, bet_amount, bet_type, game_result, payout):
-        """게임 결과 처리"""
-        current_balance = self.get_balance(user_id)
-        balance_before = current_balance
+    async def process_game_result(self, user_id, bet_amount, bet_type, game_result, payout):
+        """게임 결과 처리 (배팅 금액은 reserve_bet으로 이미 차감됨)"""
+        balances = await self.settle_round([(user_id, bet_amount, bet_type, payout)], game_result)
         
-        # 베팅 금액 차감
-        new_balance = current_balance - bet_amount
+        if user_id in balances:
+            return True, balances[user_id]
+        return False, 0
+    
+    async def settle_round(self, settlements, game_result, chat_id=None):
+        """라운드 일괄 정산
+        
+        배당금은 원장에 즉시 반영하고(users.balance는 원장 flush만 기록),
+        게임 기록과 통계는 executemany로 묶어 한 번에 커밋합니다.
         
-        # 당첨시 배당금 추가
-        if payout > 0:
-            new_balance += payout
+        Args:
+            settlements: [(user_id, bet_amount, bet_type, payout), ...]
+            game_result: play_round 결과 (카드 문자열 포함)
+            chat_id: 라운드가 진행된 채팅 (채팅별 순위표용)
         
-        # 잔액 업데이트
-        success = self.update_balance(user_id, new_balance)
+        Returns:
+            {user_id: 정산 후 잔액}
+        """
+        balances = await self.ledger.credit_many(
+            [(user_id, payout) for user_id, _, _, payout in settlements]
+        )
+        rows = [
+            (user_id, bet_amount, bet_type, payout, balances[user_id])
+            for user_id, bet_amount, bet_type, payout in settlements
+            if user_id in balances
+        ]
         
-        if success:
-            # 게임 기록 저장
-            self.db.add_game_record(
-                user_id=user_id,
-                bet_amount=bet_amount,
-                bet_type=bet_type,
+        try:
+            await self.db.settle_round(
+                rows,
                 player_cards=game_result.get('player_cards_str', ''),
                 banker_cards=game_result.get('banker_cards_str', ''),
                 player_total=game_result.get('player_total', 0),
                 banker_total=game_result.get('banker_total', 0),
                 winner=game_result.get('winner', ''),
-                payout=payout,
-                balance_before=balance_before,
-                balance_after=new_balance
+                chat_id=chat_id
             )
+        except Exception as e:
+            # 잔액은 원장에 반영되어 있으므로 기록 저장 실패만 알림
+            print(f"라운드 기록 저장 오류: {e}")
+        
+        self.rankings.on_round(chat_id, [
+            (user_id, payout - bet_amount) for user_id, bet_amount, _, payout, _ in rows
+        ])
+        
+        # 새 기록이 생긴 사용자의 캐시된 기록 페이지 무효화
+        for user_id in balances:
+            self._history_pages.pop(user_id, None)
         
-        return success, new_balance
+        return balances
     
-    def get_game_history(self, user_id, limit=10):
+    async def get_game_history(self, user_id, limit=10):
         """게임 기록 조회"""
-        records = self.db.get_game_history(user_id, limit)
+        records = await self.db.get_game_history(user_id, limit)
+        return [self._history_record(record) for record in records]
+    
+    @staticmethod
+    def _history_record(record):
+        """game_history 행을 사전으로"""
+        return {
+            'id': record[0],
+            'bet_amount': record[2],
+            'bet_type': record[3],
+            'player_cards': record[4],
+            'banker_cards': record[5],
+            'player_total': record[6],
+            'banker_total': record[7],
+            'winner': record[8],
+            'payout': record[9],
+            'balance_before': record[10],
+            'balance_after': record[11],
+            'created_at': record[12]
+        }
+    
+    async def get_game_history_page(self, user_id, before_id=None, after_id=None, limit=HISTORY_PAGE_SIZE):
+        """게임 기록 한 페이지 (id 기준 키셋 페이지네이션)
         
-        formatted_records = []
-        for record in records:
-            formatted_record = {
-                'id': record[0],
-                'bet_amount': record[2],
-                'bet_type': record[3],
-                'player_cards': record[4],
-                'banker_cards': record[5],
-                'player_total': record[6],
-                'banker_total': record[7],
-                'winner': record[8],
-                'payout': record[9],
-                'balance_before': record[10],
-                'balance_after': record[11],
-                'created_at': record[12]
-            }
-            formatted_records.append(formatted_record)
-        
-        return formatted_records
-    
-    def transfer_money(self, sender_id, recipient_username, amount):
+        한 건을 더 읽어 진행 방향에 기록이 더 있는지 확인하고, 반대 방향은
+        이동해 온 페이지가 있으므로 있다고 봅니다.
+        
+        Returns:
+            (기록 목록 (최신순), 더 오래된 기록 여부, 더 새로운 기록 여부)
+        """
+        records = await self.db.get_game_history_page(user_id, limit + 1, before_id, after_id)
+        if after_id is not None:
+            has_newer = len(records) > limit
+            records = records[-limit:]
+            has_older = True
+        else:
+            has_older = len(records) > limit
+            records = records[:limit]
+            has_newer = before_id is not None
+        return [self._history_record(record) for record in records], has_older, has_newer
+    
+    async def get_user_stats(self, user_id):
+        """배팅 종류별 누적 통계 {배팅 종류: {'rounds', 'wagered', 'payout', 'wins'}}"""
+        rows = await self.db.get_user_stats(user_id)
+        return {
+            bet_type: {'rounds': rounds, 'wagered': wagered, 'payout': payout, 'wins': wins}
+            for bet_type, rounds, wagered, payout, wins in rows
+        }
+    
+    async def format_user_stats(self, user_id):
+        """통계 포맷 (전체 + 배팅 종류별)"""
+        stats = await self.get_user_stats(user_id)
+        if not stats:
+            return "📈 아직 게임 기록이 없습니다."
+        
+        def summary(rounds, wagered, payout, wins):
+            net = payout - wagered
+            return (f"{rounds:,}판, 승률 {wins / rounds:.1%}, 배팅 {wagered:,}원, "
+                    f"순이익 {'+' if net > 0 else ''}{net:,}원")
+        
+        totals = [sum(entry[key] for entry in stats.values()) for key in ('rounds', 'wagered', 'payout', 'wins')]
+        lines = ["📈 내 게임 통계", "", f"📊 전체: {summary(*totals)}"]
+        for bet_type in ('플레이어', '뱅커', '무승부'):
+            entry = stats.get(bet_type)
+            if entry:
+                lines.append(f"🎯 {bet_type}: {summary(entry['rounds'], entry['wagered'], entry['payout'], entry['wins'])}")
+        return "\n".join(lines)
+    
+    async def format_leaderboard(self, chat_id=None, board='balance', limit=LEADERBOARD_TOP_N):
+        """상위 순위 포맷 (board: 'balance' 또는 'profit', chat_id가 있으면 채팅 순위)"""
+        balance_board, profit_board = self.rankings.boards(chat_id)
+        leaderboard = profit_board if board == 'profit' else balance_board
+        title = "순이익" if board == 'profit' else "잔액"
+        scope = "이 채팅" if chat_id is not None else "전체"
+        
+        entries = leaderboard.top(limit)
+        if not entries:
+            return f"🏆 {scope} {title} 순위에 아직 아무도 없습니다."
+        
+        names = await self.db.get_display_names(user_id for user_id, _ in entries)
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        lines = [f"🏆 {scope} {title} 순위 ({len(leaderboard):,}명)", ""]
+        for rank, (user_id, score) in enumerate(entries, 1):
+            sign = '+' if board == 'profit' and score > 0 else ''
+            lines.append(f"{medals.get(rank, f'{rank}.')} {names.get(user_id, user_id)} - {sign}{score:,}원")
+        return "\n".join(lines)
+    
+    async def format_rank(self, user_id, chat_id=None):
+        """내 잔액/순이익 순위 포맷"""
+        balance_board, profit_board = self.rankings.boards(chat_id)
+        scope = "이 채팅" if chat_id is not None else "전체"
+        
+        lines = [f"📊 {scope} 내 순위"]
+        for title, leaderboard in (("잔액", balance_board), ("순이익", profit_board)):
+            rank = leaderboard.rank(user_id)
+            if rank is None:
+                lines.append(f"{title}: 기록 없음")
+                continue
+            score = leaderboard.scores[user_id]
+            sign = '+' if leaderboard is profit_board and score > 0 else ''
+            lines.append(f"{title}: {rank:,}위 / {len(leaderboard):,}명 ({sign}{score:,}원)")
+        return "\n".join(lines)
+    
+    async def transfer_money(self, sender_id, recipient_username, amount):
         """송금 처리"""
         # 송금자 정보 확인
-        sender = self.db.get_user(sender_id)
+        sender = await self.db.get_user(sender_id)
         if not sender:
             return False, "송금자 정보를 찾을 수 없습니다."
         
         # 수신자 정보 확인
-        recipient = self.db.get_user_by_username(recipient_username.replace('@', ''))
+        recipient = await self.db.get_user_by_username(recipient_username.replace('@', ''))
         if not recipient:
             return False, f"사용자 '{recipient_username}'를 찾을 수 없습니다."
         
@@ -127,23 +287,18 @@ class UserService:
         if amount <= 0:
             return False, "송금 금액은 0원보다 커야 합니다."
         
-        if sender['balance'] < amount:
-            return False, f"잔액이 부족합니다. 현재 잔액: {sender['balance']}원"
-        
-        # 송금 처리
-        sender_balance_before = sender['balance']
-        recipient_balance_before = recipient['balance']
-        
-        sender_balance_after = sender_balance_before - amount
-        recipient_balance_after = recipient_balance_before + amount
-        
-        # 잔액 업데이트
-        sender_success = self.update_balance(sender_id, sender_balance_after)
-        recipient_success = self.update_balance(recipient['user_id'], recipient_balance_after)
-        
-        if sender_success and recipient_success:
+        # 두 사용자 잠금을 정렬된 순서로 잡아 이체와 기록 사이에 다른 작업이 끼지 않게 함
+        async with self.user_locks.hold(sender_id, recipient['user_id']):
+            # 송금 처리 (원장에서 잔액 확인과 이체를 한 번에 처리)
+            balances = await self.ledger.transfer(sender_id, recipient['user_id'], amount)
+            if balances is None:
+                current_balance = await self.get_balance(sender_id)
+                return False, f"잔액이 부족합니다. 현재 잔액: {current_balance}원"
+            
+            sender_balance_before, sender_balance_after, recipient_balance_before, recipient_balance_after = balances
+            
             # 송금 기록 저장
-            self.db.add_transfer_record(
+            await self.db.add_transfer_record(
                 sender_id=sender_id,
                 recipient_id=recipient['user_id'],
                 amount=amount,
@@ -153,95 +308,125 @@ class UserService:
                 recipient_balance_after=recipient_balance_after
             )
             return True, f"송금이 완료되었습니다. 현재 잔액: {sender_balance_after}원"
-        else:
-            return False, "송금 처리 중 오류가 발생했습니다."
     
-    def format_balance_info(self, user_id):
+    async def format_balance_info(self, user_id):
         """잔액 정보 포맷"""
-        user = self.get_user_info(user_id)
+        user = await self.get_user_info(user_id)
         if user:
             return f"💰 현재 잔액: {user['balance']:,}원"
         return "❌ 사용자 정보를 찾을 수 없습니다."
     
-    def format_game_history(self, user_id, limit=5):
-        """게임 기록 포맷"""
-        records = self.get_game_history(user_id, limit)
+    async def format_game_history(self, user_id, before_id=None, after_id=None):
+        """게임 기록 페이지 포맷 (렌더링 결과는 사용자의 라운드가 정산될 때까지 캐시)
         
-        if not records:
-            return "📊 게임 기록이 없습니다."
+        Returns:
+            (메시지, 이전(오래된) 페이지 before_id, 다음(최신) 페이지 after_id)
+            이동할 페이지가 없으면 커서는 None
+        """
+        key = (before_id, after_id)
+        pages = self._history_pages.get(user_id)
+        if pages is None:
+            pages = self._history_pages[user_id] = {}
+            if len(self._history_pages) > HISTORY_CACHE_USERS:
+                self._history_pages.popitem(last=False)
+        else:
+            self._history_pages.move_to_end(user_id)
+            if key in pages:
+                return pages[key]
+        
+        records, has_older, has_newer = await self.get_game_history_page(user_id, before_id, after_id)
+        page = self._render_history_page(records, has_older, has_newer, first=before_id is None and after_id is None)
         
-        history_text = "📊 최근 게임 기록:\n\n"
+        # 조회 중 정산으로 무효화되었으면 캐시하지 않음
+        if self._history_pages.get(user_id) is pages:
+            if len(pages) >= HISTORY_CACHE_PAGES:
+                del pages[next(iter(pages))]
+            pages[key] = page
+        return page
+    
+    @staticmethod
+    def _render_history_page(records, has_older, has_newer, first):
+        if not records:
+            return "📊 게임 기록이 없습니다.", None, None
         
-        for i, record in enumerate(records, 1):
+        lines = ["📊 최근 게임 기록:" if first else "📊 게임 기록:", ""]
+        for record in records:
             result_emoji = "✅" if record['payout'] > 0 else "❌"
             balance_change = record['balance_after'] - record['balance_before']
             change_text = f"+{balance_change:,}" if balance_change > 0 else f"{balance_change:,}"
             
-            history_text += f"{i}. {result_emoji} {record['bet_type']} 베팅\n"
-            history_text += f"   💰 베팅: {record['bet_amount']:,}원\n"
-            history_text += f"   🎯 결과: {record['winner']} 승리\n"
-            history_text += f"   💵 수익: {change_text}원\n"
-            history_text += f"   📅 {record['created_at'][:16]}\n\n"
+            lines.append(f"{result_emoji} {record['bet_type']} 베팅")
+            lines.append(f"   💰 베팅: {record['bet_amount']:,}원")
+            lines.append(f"   🎯 결과: {record['winner']} 승리")
+            lines.append(f"   💵 수익: {change_text}원")
+            lines.append(f"   📅 {record['created_at'][:16]}")
+            lines.append("")
         
-        return history_text.strip()
+        older_cursor = records[-1]['id'] if has_older else None
+        newer_cursor = records[0]['id'] if has_newer else None
+        return "\n".join(lines).strip(), older_cursor, newer_cursor
 
-    def check_attendance(self, user_id):
+    async def check_attendance(self, user_id):
         """출석 체크 처리"""
-        # 오늘 이미 출석했는지 확인
-        if self.db.check_attendance_today(user_id):
-            consecutive_days = self.db.get_consecutive_attendance(user_id)
-            return False, f"오늘 이미 출석했습니다.", consecutive_days
-        
-        # 연속 출석 일수 계산
-        consecutive_days = self.db.get_consecutive_attendance(user_id) + 1
-        
-        # 기본 출석 보상
-        reward = DAILY_ATTENDANCE_REWARD
-        bonus_message = ""
-        
-        # 7일 연속 출석 보너스
-        if consecutive_days % 7 == 0:
-            reward += WEEKLY_BONUS
-            bonus_message = f"\n🎉 7일 연속 출석 달성! 보너스 {WEEKLY_BONUS:,}원 추가!"
-        
-        # 잔액 추가
-        success = self.add_balance(user_id, reward)
-        
-        if success:
-            # 출석 기록 저장
-            self.db.add_attendance_record(user_id, reward, consecutive_days)
-            current_balance = self.get_balance(user_id)
+        # 확인과 지급 사이의 await 동안 같은 사용자의 두 번째 출석이 끼어들지 않도록
+        async with self.user_locks.hold(user_id):
+            # 오늘 이미 출석했는지 확인
+            if await self.db.check_attendance_today(user_id):
+                consecutive_days = await self.db.get_consecutive_attendance(user_id)
+                return False, f"오늘 이미 출석했습니다.", consecutive_days
             
-            return True, f"출석 체크 완료! {reward:,}원 지급{bonus_message}", consecutive_days, current_balance
-        else:
-            return False, "출석 처리 중 오류가 발생했습니다.", consecutive_days
+            # 연속 출석 일수 계산
+            consecutive_days = await self.db.get_consecutive_attendance(user_id) + 1
+            
+            # 기본 출석 보상
+            reward = DAILY_ATTENDANCE_REWARD
+            bonus_message = ""
+            
+            # 7일 연속 출석 보너스
+            if consecutive_days % 7 == 0:
+                reward += WEEKLY_BONUS
+                bonus_message = f"\n🎉 7일 연속 출석 달성! 보너스 {WEEKLY_BONUS:,}원 추가!"
+            
+            # 잔액 추가
+            success = await self.add_balance(user_id, reward)
+            
+            if success:
+                # 출석 기록 저장
+                await self.db.add_attendance_record(user_id, reward, consecutive_days)
+                current_balance = await self.get_balance(user_id)
+                
+                return True, f"출석 체크 완료! {reward:,}원 지급{bonus_message}", consecutive_days, current_balance
+            else:
+                return False, "출석 처리 중 오류가 발생했습니다.", consecutive_days
 
 # 테스트 함수
-def test_user_service():
+async def test_user_service():
     """사용자 서비스 테스트"""
     service = UserService()
     
     # 테스트 사용자 생성
     test_user_id = 12345
-    service.register_user(test_user_id, "testuser", "Test", "User")
+    await service.register_user(test_user_id, "testuser", "Test", "User")
     
     print("=== 사용자 서비스 테스트 ===")
     
     # 잔액 확인
-    balance = service.get_balance(test_user_id)
+    balance = await service.get_balance(test_user_id)
     print(f"초기 잔액: {balance}원")
     
     # 베팅 가능 여부 확인
-    can_bet, message = service.can_bet(test_user_id, 1000)
+    can_bet, message = await service.can_bet(test_user_id, 1000)
     print(f"1000원 베팅 가능: {can_bet} - {message}")
     
     # 잔액 추가/차감 테스트
-    service.add_balance(test_user_id, 5000)
-    print(f"5000원 추가 후 잔액: {service.get_balance(test_user_id)}원")
+    await service.add_balance(test_user_id, 5000)
+    print(f"5000원 추가 후 잔액: {await service.get_balance(test_user_id)}원")
+    
+    await service.subtract_balance(test_user_id, 2000)
+    print(f"2000원 차감 후 잔액: {await service.get_balance(test_user_id)}원")
     
-    service.subtract_balance(test_user_id, 2000)
-    print(f"2000원 차감 후 잔액: {service.get_balance(test_user_id)}원")
+    await service.close()
 
 if __name__ == "__main__":
-    test_user_service()
+    asyncio.run(test_user_service())
 